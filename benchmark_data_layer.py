@@ -0,0 +1,282 @@
+"""
+Data-layer benchmarks for the CRM, run headless (no Streamlit server, no Google credentials).
+
+    python benchmark_data_layer.py --sizes 1000 10000 100000 --backend memory --output bench.json
+
+Each size seeds synthetic users, clients, listings and deals, then times the app's own
+functions and records their peak Python memory. Results are written as JSON (one record per
+size and operation) so runs from different commits can be compared.
+
+Backends: 'memory' (no persistence), 'fake_sheets' (fake_sheets.FakeSheetsClient behind
+SheetsStorage) and 'sqlite' (a temporary SQLiteStorage file). For the queued backends
+'flush_ms' is the time for the write to actually land.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import streamlit as st
+
+# The app is imported outside `streamlit run`, which makes Streamlit warn on every call
+logging.disable(logging.WARNING)
+
+import lyns_crm_app as app
+from fake_sheets import FakeSheetsClient
+
+PARTNERS = [f"Partner {i:02d}" for i in range(10)]
+PASSWORD = 'bench-password'
+SHEETS_CONFIG = {'users_sheet_id': 'users', 'clients_sheet_id': 'clients',
+                 'listings_sheet_id': 'listings', 'deals_sheet_id': 'deals'}
+STATUSES = ["New Lead", "Contacted", "Site Visit Scheduled", "Site Visit Done", "Interested",
+            "Negotiation", "Deal in Progress", "Deal Closed", "On Hold", "Not Interested"]
+
+
+def synthetic_tables(size, seed):
+    rng = random.Random(seed)
+    users = [{'Username': 'admin', 'Password': app.hash_password(PASSWORD), 'Role': 'Admin',
+              'Full_Name': 'Lyndon', 'Email': 'admin@example.com', 'Status': 'Active'}]
+    users += [{'Username': f"partner{i:02d}", 'Password': app.hash_password(PASSWORD), 'Role': 'Partner',
+               'Full_Name': name, 'Email': f"partner{i:02d}@example.com", 'Status': 'Active'}
+              for i, name in enumerate(PARTNERS)]
+    assignees = ['Unassigned', 'Admin'] + PARTNERS
+    clients = [{
+        'Client_ID': f"C{i + 1:04d}", 'Client_Name': f"Client {i}", 'Contact_Number': f"98{rng.randrange(10**8):08d}",
+        'Email': f"client{i}@example.com", 'Client_Type': rng.choice(["Sale", "Rental"]),
+        'Property_Category': rng.choice(["Residential", "Commercial"]), 'Property_Type': "Apartment",
+        'Furnishing_Status': rng.choice(["Furnished", "Semi-Furnished", "Unfurnished"]),
+        'Budget_Min': rng.randrange(20, 200), 'Budget_Max': rng.randrange(200, 500), 'Budget_Currency': "₹ Lakhs",
+        'Location_Preference': ", ".join(rng.sample(app.LOCATIONS, 2)), 'BHK_Requirement': rng.choice(["1 BHK", "2 BHK", "3 BHK"]),
+        'Requirements_Notes': "Near station, east facing", 'Possession_Date': '', 'Status': rng.choice(STATUSES),
+        'Assigned_To': rng.choice(assignees), 'Date_Registered': f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+        'Source': rng.choice(["SquareYards", "Referral", "Direct", "Website", "Other"]),
+        'Priority': rng.choice(["Low", "Medium", "High"])
+    } for i in range(size)]
+    listings = [{
+        'Listing_ID': f"L{i + 1:04d}", 'Property_Address': f"{i} Main Road", 'Location': rng.choice(app.LOCATIONS),
+        'Property_Category': "Residential", 'Property_Type': "Apartment", 'Furnishing_Status': "Unfurnished",
+        'BHK': rng.choice(["1 BHK", "2 BHK", "3 BHK"]), 'Price': rng.randrange(30, 400), 'Price_Currency': "₹ Lakhs",
+        'Area_SqFt': rng.randrange(400, 2000), 'Broker_Name': "Broker", 'Broker_Contact': "9800000000",
+        'Amenities': "Lift, Parking", 'Listing_Status': "Available", 'Date_Added': "2024-01-01",
+        'Visible_To_Partner': rng.choice(["Yes", "No"]), 'Notes': '', 'Assigned_To': rng.choice(assignees),
+        'Shown_To_Clients': ''
+    } for i in range(size)]
+    deals = []
+    for i in range(max(1, size // 10)):
+        owner, client = rng.randrange(10000, 100000), rng.randrange(10000, 100000)
+        deals.append({
+            'Deal_ID': f"D{i + 1:04d}", 'Client_ID': f"C{rng.randrange(size) + 1:04d}", 'Listing_ID': 'N/A',
+            'Brokerage_From_Owner': owner, 'Brokerage_From_Client': client, 'Total_Brokerage': owner + client,
+            'Number_Of_Brokers': 1, 'Your_Share': (owner + client) * 0.9, 'Partner_Share': (owner + client) * 0.1,
+            'Partner_Name': rng.choice(PARTNERS), 'Deal_Date': "2024-01-01", 'Payment_Status': "Pending", 'Notes': ''
+        })
+    return {'users': pd.DataFrame(users), 'clients': pd.DataFrame(clients),
+            'listings': pd.DataFrame(listings), 'deals': pd.DataFrame(deals)}
+
+
+def make_storage(backend, workdir, latency=0.0):
+    if backend == 'fake_sheets':
+        return app.SheetsStorage(FakeSheetsClient(latency=latency, seed=0), dict(SHEETS_CONFIG))
+    if backend == 'sqlite':
+        return app.SQLiteStorage(os.path.join(workdir, f"bench-{time.time_ns()}.db"))
+    return None
+
+
+def seed_session(tables, storage):
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    # Every size starts from empty process-wide caches
+    st.cache_resource.clear()
+    st.session_state.storage = storage
+    for table, df in tables.items():
+        st.session_state[table] = df.copy()
+        if storage:
+            storage.save(table, st.session_state[table])
+    flush_storage()
+    app.initialize_session_state()
+    app.initialize_data()
+
+
+def flush_storage():
+    storage = st.session_state.get('storage')
+    if isinstance(storage, app.SheetsStorage) or getattr(storage, 'mirror', None):
+        app._write_queue().flush()
+
+
+def new_client(rng):
+    return {
+        'name': f"Bench Client {rng.randrange(10**6)}", 'contact': "9812345678", 'email': "bench@example.com",
+        'client_type': "Sale", 'property_category': "Residential", 'property_type': "Apartment",
+        'furnishing_status': "Furnished", 'budget_min': 50, 'budget_max': 90, 'budget_currency': "₹ Lakhs",
+        'location': "Powai, Marol", 'bhk': "2 BHK", 'requirements': "Benchmark", 'possession_date': '',
+        'assigned_to': rng.choice(PARTNERS), 'source': "Direct", 'priority': "High"
+    }
+
+
+def operations(rng):
+    def client_id():
+        return rng.choice(st.session_state.clients['Client_ID'].tolist())
+
+    def add_client():
+        app.add_client(new_client(rng))
+        app.flush_inserts()
+
+    def update_client_status():
+        app.update_client_status(client_id(), rng.choice(STATUSES))
+
+    def delete_client():
+        app.delete_client(client_id())
+    
+    def close_deal():
+        # Two tables saved in one unit of work, as the Close Deal form does
+        client = client_id()
+        with app.unit_of_work():
+            app.add_deal({'client_id': client, 'listing_id': 'N/A', 'brokerage_owner': 50000, 'brokerage_client': 50000,
+                          'num_brokers': 1, 'partner_name': rng.choice(PARTNERS), 'notes': ''})
+            app.update_client_status(client, 'Deal Closed')
+
+    def authenticate():
+        app.authenticate(f"partner{rng.randrange(len(PARTNERS)):02d}", PASSWORD)
+
+    def partner_filters():
+        partner = rng.choice(PARTNERS)
+        app.partner_clients(partner)
+        app.partner_listings(partner)
+        app.partner_deals(partner)
+
+    def admin_dashboard():
+        app.admin_summary()
+
+    def partner_dashboard():
+        app.partner_summary(rng.choice(PARTNERS))
+
+    def refresh():
+        # Refresh Data: every table is read from storage again, as on a cold sign-in
+        app.refresh_data()
+        app.initialize_data()
+    
+    def new_session():
+        # Another browser session loading the same tables; peak_kib is what each extra session costs
+        saved = swap_session({'storage': st.session_state.storage})
+        app.initialize_session_state()
+        app.initialize_data()
+        swap_session(saved)
+
+    other = {}
+
+    def other_session_write():
+        # Another session saves one client; this one then reloads and reruns its dashboard and a search
+        saved = swap_session(other or {'storage': st.session_state.storage})
+        if not other:
+            app.initialize_session_state()
+        app.initialize_data()
+        app.update_client_status(client_id(), rng.choice(STATUSES))
+        other.update(swap_session(saved))
+        app.initialize_data()
+        app.admin_summary()
+        app.search_records('clients', 'station')
+
+    local = [add_client, update_client_status, delete_client, close_deal, authenticate, partner_filters,
+             admin_dashboard, partner_dashboard]
+    # Without storage there is nothing to re-read and other sessions start out empty
+    return local if st.session_state.storage is None else local + [refresh, new_session, other_session_write]
+
+
+def swap_session(state):
+    # Replaces the session state, returning the one it replaced
+    saved = {key: st.session_state[key] for key in st.session_state}
+    for key in saved:
+        del st.session_state[key]
+    st.session_state.update(state)
+    return saved
+
+
+def measure(operation, repeat):
+    timings, flushes = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        flush_storage()
+        flushes.append(time.perf_counter() - start)
+    tracemalloc.start()
+    operation()
+    flush_storage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'min_ms': round(min(timings) * 1000, 3),
+        'flush_ms': round(statistics.median(flushes) * 1000, 3),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backend', choices=['memory', 'fake_sheets', 'sqlite'], default='memory')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per fake Sheets call")
+    parser.add_argument('--no-quota', action='store_true',
+                        help="turn off the app's Sheets request limits (SHEETS_QUOTA)")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # Notifications are not part of the data layer and would try to reach an SMTP server
+    app.send_email_notification = lambda *args, **kwargs: False
+    if args.no_quota:
+        app.SHEETS_QUOTA = {'read': None, 'write': None}
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            tables = synthetic_tables(size, args.seed)
+            rng = random.Random(args.seed)
+            start = time.perf_counter()
+            seed_session(tables, make_storage(args.backend, workdir, args.latency))
+            results.append({'size': size, 'operation': 'seed', 'median_ms': round((time.perf_counter() - start) * 1000, 3)})
+            for operation in operations(rng):
+                results.append({'size': size, 'operation': operation.__name__, **measure(operation, args.repeat)})
+                print(f"{size:>7} {operation.__name__:<22} {results[-1]['median_ms']:>10.3f} ms", file=sys.stderr)
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'backend': args.backend,
+        'latency': args.latency,
+        'sheets_quota': None if args.no_quota else app.SHEETS_QUOTA,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Cold-start timings for the Streamlit entry point, run headless (no browser, no Google credentials).
+
+    python benchmark_startup.py --size 1000 --repeat 5 --output startup.json
+
+Every repeat starts fresh Python processes and records the time to import the libraries the
+app needs, the time to import the app module on top of them, the first script run (the login
+page) and the run after signing in (which loads the remaining tables). It also lists which of
+the heavy, lazily imported modules each stage pulled in. The app runs in a temporary directory
+on a local SQLite database seeded with the synthetic tables from benchmark_data_layer.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lyns_crm_app.py')
+HEAVY_MODULES = ['gspread', 'google.oauth2.service_account', 'smtplib', 'email.mime.multipart']
+LIBRARIES = ['streamlit', 'pandas', 'numpy']
+
+
+def heavy_loaded():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def measure_import():
+    logging.disable(logging.WARNING)
+    start = time.perf_counter()
+    for name in LIBRARIES:
+        __import__(name)
+    libraries = time.perf_counter() - start
+    sys.path.insert(0, os.path.dirname(APP))
+    start = time.perf_counter()
+    import lyns_crm_app  # noqa: F401
+    return {'libraries_ms': libraries * 1000, 'app_import_ms': (time.perf_counter() - start) * 1000,
+            'heavy_after_import': heavy_loaded()}
+
+
+def measure_render(username, password):
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(APP, default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    first_render = time.perf_counter() - start
+    heavy_after_login_page = heavy_loaded()
+    app.text_input[0].input(username)
+    app.text_input[1].input(password)
+    start = time.perf_counter()
+    app.button[0].click().run()
+    signed_in = time.perf_counter() - start
+    if not app.session_state.logged_in:
+        raise RuntimeError("could not sign in to the app")
+    return {'first_render_ms': first_render * 1000, 'signed_in_ms': signed_in * 1000,
+            'heavy_after_login_page': heavy_after_login_page, 'heavy_after_sign_in': heavy_loaded()}
+
+
+def run_stage(stage, workdir):
+    # A fresh interpreter per stage, so nothing is already imported or cached
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--stage', stage], cwd=workdir,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def seed_database(workdir, size, seed):
+    sys.path.insert(0, os.path.dirname(APP))
+    logging.disable(logging.WARNING)
+    import benchmark_data_layer as bench
+    import lyns_crm_app as app
+    storage = app.SQLiteStorage(os.path.join(workdir, 'lyns_crm.db'))
+    for table, df in bench.synthetic_tables(size, seed).items():
+        storage.save(table, df)
+    with open(os.path.join(workdir, 'sheets_config.json'), 'w') as f:
+        json.dump({'storage': {'backend': 'sqlite', 'path': 'lyns_crm.db'}}, f)
+    return 'admin', bench.PASSWORD
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000, help="rows in the synthetic clients and listings tables")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    parser.add_argument('--stage', choices=['import', 'render'], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.stage == 'import':
+        print(json.dumps(measure_import()))
+        return
+    if args.stage == 'render':
+        with open('credentials.json') as f:
+            print(json.dumps(measure_render(*json.load(f))))
+        return
+
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, 'credentials.json'), 'w') as f:
+            json.dump(seed_database(workdir, args.size, args.seed), f)
+        for i in range(args.repeat):
+            runs.append({**run_stage('import', workdir), **run_stage('render', workdir)})
+            print(f"run {i + 1}: import {runs[-1]['app_import_ms']:.0f} ms, "
+                  f"login page {runs[-1]['first_render_ms']:.0f} ms, signed in {runs[-1]['signed_in_ms']:.0f} ms",
+                  file=sys.stderr)
+
+    timings = ['libraries_ms', 'app_import_ms', 'first_render_ms', 'signed_in_ms']
+    report = {
+        'revision': subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                   cwd=os.path.dirname(APP)).stdout.strip() or None,
+        'python': platform.python_version(),
+        'size': args.size,
+        'repeat': args.repeat,
+        'median': {name: round(statistics.median(run[name] for run in runs), 1) for name in timings},
+        'min': {name: round(min(run[name] for run in runs), 1) for name in timings},
+        'heavy_modules': {stage: runs[-1][stage] for stage in
+                          ['heavy_after_import', 'heavy_after_login_page', 'heavy_after_sign_in']},
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
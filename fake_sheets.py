@@ -0,0 +1,290 @@
+"""
+Local stand-in for the parts of gspread the CRM uses, for offline testing and benchmarking.
+
+    client = FakeSheetsClient(latency=0.2, write_quota=60, seed=1)
+    client.fail_next('append_rows', status=503)
+    st.session_state.storage = SheetsStorage(client, {'users_sheet_id': 'users', ...})
+
+Spreadsheets are created on first open_by_key. Every call sleeps for the configured latency,
+counts against a per-minute read or write quota (429 once exceeded) and can be made to fail,
+either at a seeded random rate or on demand with fail_next. client.stats counts calls and
+cells moved so data-layer changes can be compared without a network.
+"""
+
+import random
+import threading
+import time
+from collections import Counter, deque
+
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, numericise_all
+
+READ_CALLS = {'get_all_records', 'get_all_values', 'row_values', 'col_values', 'open_by_key', 'worksheet'}
+
+
+class _Response:
+    # Just enough of requests.Response for gspread's APIError
+    def __init__(self, status, message):
+        self.status_code = status
+        self.text = message
+        self._status = {400: 'INVALID_ARGUMENT', 404: 'NOT_FOUND', 429: 'RESOURCE_EXHAUSTED'}.get(status, 'UNAVAILABLE')
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': self.text, 'status': self._status}}
+
+
+def api_error(status, message):
+    return APIError(_Response(status, message))
+
+
+def _display(value):
+    # Values come back as the formatted strings Sheets would show
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return '' if value is None else str(value)
+
+
+class FakeSheetsClient:
+    def __init__(self, latency=0.0, jitter=0.0, read_quota=None, write_quota=None,
+                 failure_rate=0.0, seed=None, auto_create=True, clock=time.monotonic, sleep=time.sleep):
+        self.latency = latency
+        self.jitter = jitter
+        self.read_quota = read_quota
+        self.write_quota = write_quota
+        self.failure_rate = failure_rate
+        self.auto_create = auto_create
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.RLock()
+        self._spreadsheets = {}
+        self._failures = {}
+        self._calls = {'read': deque(), 'write': deque()}
+
+    def fail_next(self, method, status=500, count=1):
+        with self._lock:
+            self._failures.setdefault(method, deque()).extend([status] * count)
+
+    def seed_rows(self, sheet_id, rows, sheet_name="Sheet1"):
+        worksheet = self._spreadsheet(sheet_id, create=True)._worksheet(sheet_name, create=True)
+        worksheet._rows = [list(row) for row in rows]
+
+    def dump_rows(self, sheet_id, sheet_name="Sheet1"):
+        return [list(row) for row in self._spreadsheets[sheet_id]._worksheet(sheet_name)._rows]
+
+    def _call(self, method, cells=0):
+        kind = 'read' if method in READ_CALLS else 'write'
+        with self._lock:
+            self.stats[method] += 1
+            self.stats[f'{kind}_cells'] += cells
+            failures = self._failures.get(method)
+            status = failures.popleft() if failures else None
+            if status is None and self.failure_rate and self._random.random() < self.failure_rate:
+                status = 503
+            quota = self.read_quota if kind == 'read' else self.write_quota
+            calls = self._calls[kind]
+            now = self._clock()
+            while calls and now - calls[0] >= 60:
+                calls.popleft()
+            if status is None and quota is not None and len(calls) >= quota:
+                status = 429
+            calls.append(now)
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            self._sleep(delay)
+        if status is not None:
+            self.stats['errors'] += 1
+            raise api_error(status, f"Injected failure in {method}" if status != 429 else
+                            f"Quota exceeded for {kind} requests per minute")
+
+    def _spreadsheet(self, sheet_id, create=False):
+        with self._lock:
+            if sheet_id not in self._spreadsheets:
+                if not (create or self.auto_create):
+                    raise SpreadsheetNotFound(sheet_id)
+                self._spreadsheets[sheet_id] = FakeSpreadsheet(self, sheet_id)
+            return self._spreadsheets[sheet_id]
+
+    def open_by_key(self, sheet_id):
+        self._call('open_by_key')
+        return self._spreadsheet(sheet_id)
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, sheet_id):
+        self.client = client
+        self.id = sheet_id
+        self._worksheets = {}
+
+    def _worksheet(self, name, create=False):
+        if name not in self._worksheets:
+            if not (create or self.client.auto_create and not self._worksheets):
+                raise WorksheetNotFound(name)
+            self._worksheets[name] = FakeWorksheet(self, name, len(self._worksheets))
+        return self._worksheets[name]
+
+    def worksheet(self, name):
+        self.client._call('worksheet')
+        with self.client._lock:
+            return self._worksheet(name)
+
+    def batch_update(self, body):
+        requests = body.get('requests', [])
+        self.client._call('batch_update', sum(_request_cells(r) for r in requests))
+        with self.client._lock:
+            by_id = {ws.id: ws for ws in self._worksheets.values()}
+            for request in requests:
+                (kind, args), = request.items()
+                sheet_id = args.get('sheetId', args.get('range', {}).get('sheetId', args.get('start', {}).get('sheetId')))
+                if sheet_id not in by_id:
+                    raise api_error(400, f"No grid with id: {sheet_id}")
+                by_id[sheet_id]._apply(kind, args)
+        return {'spreadsheetId': self.id, 'replies': [{} for _ in requests]}
+
+
+def _request_cells(request):
+    (kind, args), = request.items()
+    return sum(len(row.get('values', [])) for row in args.get('rows', []))
+
+
+def _cell_value(cell):
+    value = cell.get('userEnteredValue', {})
+    return next(iter(value.values()), '')
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, sheet_id):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self._rows = []
+
+    @property
+    def client(self):
+        return self.spreadsheet.client
+
+    @property
+    def row_count(self):
+        return max(1000, len(self._rows))
+
+    @property
+    def col_count(self):
+        return max([26] + [len(row) for row in self._rows])
+
+    def _grid(self, range_name):
+        grid = a1_range_to_grid_range(range_name.split('!')[-1])
+        return (grid.get('startRowIndex', 0), grid.get('endRowIndex', self.row_count),
+                grid.get('startColumnIndex', 0), grid.get('endColumnIndex', self.col_count))
+
+    def _write(self, row_index, col_index, values):
+        for r, row in enumerate(values):
+            while len(self._rows) <= row_index + r:
+                self._rows.append([])
+            target = self._rows[row_index + r]
+            while len(target) < col_index + len(row):
+                target.append('')
+            target[col_index:col_index + len(row)] = list(row)
+
+    def _trim(self):
+        while self._rows and not any(v != '' for v in self._rows[-1]):
+            self._rows.pop()
+
+    def get_all_values(self):
+        self.client._call('get_all_values')
+        with self.client._lock:
+            width = max([0] + [len(row) for row in self._rows])
+            return [[_display(v) for v in row] + [''] * (width - len(row)) for row in self._rows]
+
+    def get_all_records(self, head=1, default_blank='', numericise_ignore=()):
+        self.client._call('get_all_records')
+        with self.client._lock:
+            rows = [[_display(v) for v in row] for row in self._rows]
+        if len(rows) <= head - 1:
+            return []
+        header = rows[head - 1]
+        records = []
+        for row in rows[head:]:
+            values = row + [''] * (len(header) - len(row))
+            if list(numericise_ignore) == ['all']:
+                values = [default_blank if v == '' else v for v in values]
+            else:
+                values = numericise_all(values, default_blank=default_blank, ignore=list(numericise_ignore))
+            records.append(dict(zip(header, values)))
+        return records
+
+    def row_values(self, row):
+        self.client._call('row_values')
+        with self.client._lock:
+            values = self._rows[row - 1] if len(self._rows) >= row else []
+            return [_display(v) for v in values]
+
+    def col_values(self, col):
+        self.client._call('col_values')
+        with self.client._lock:
+            values = [_display(row[col - 1]) if len(row) >= col else '' for row in self._rows]
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def update(self, values, range_name=None, **kwargs):
+        if isinstance(values, str) or (range_name is not None and not isinstance(range_name, str)):
+            values, range_name = range_name, values
+        self.client._call('update', sum(len(row) for row in values))
+        with self.client._lock:
+            row_index, _, col_index, _ = self._grid(range_name or 'A1')
+            self._write(row_index, col_index, values)
+            self._trim()
+        return {'updatedCells': sum(len(row) for row in values)}
+
+    def batch_update(self, data, **kwargs):
+        self.client._call('batch_update', sum(len(row) for item in data for row in item['values']))
+        with self.client._lock:
+            for item in data:
+                row_index, _, col_index, _ = self._grid(item['range'])
+                self._write(row_index, col_index, item['values'])
+            self._trim()
+        return {'totalUpdatedCells': sum(len(row) for item in data for row in item['values'])}
+
+    def clear(self):
+        self.client._call('clear')
+        with self.client._lock:
+            self._rows = []
+
+    def batch_clear(self, ranges):
+        self.client._call('batch_clear')
+        with self.client._lock:
+            for range_name in ranges:
+                top, bottom, left, right = self._grid(range_name)
+                for row in self._rows[top:bottom]:
+                    row[left:right] = [''] * len(row[left:right])
+            self._trim()
+
+    def append_row(self, values, value_input_option='RAW', **kwargs):
+        return self.append_rows([values], value_input_option, **kwargs)
+
+    def append_rows(self, values, value_input_option='RAW', **kwargs):
+        self.client._call('append_rows', sum(len(row) for row in values))
+        with self.client._lock:
+            self._trim()
+            self._rows.extend(list(row) for row in values)
+        return {'updates': {'updatedRows': len(values)}}
+
+    def _apply(self, kind, args):
+        if kind == 'deleteDimension':
+            grid = args['range']
+            if grid.get('dimension', 'ROWS') != 'ROWS':
+                raise api_error(400, "Only row deletes are supported")
+            del self._rows[grid['startIndex']:grid['endIndex']]
+        elif kind == 'updateCells':
+            start = args['start']
+            self._write(start.get('rowIndex', 0), start.get('columnIndex', 0),
+                        [[_cell_value(c) for c in row.get('values', [])] for row in args['rows']])
+        elif kind == 'appendCells':
+            self._trim()
+            self._rows.extend([_cell_value(c) for c in row.get('values', [])] for row in args['rows'])
+        else:
+            raise api_error(400, f"Unsupported request: {kind}")
+        self._trim()
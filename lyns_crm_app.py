@@ -4,14 +4,31 @@ Lyns Real Estate CRM - Complete Business Version
 
 import streamlit as st
 import pandas as pd
-from datetime import datetime, date
+import numpy as np
+from datetime import datetime, date, timedelta, timezone
 import hashlib
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import uuid
 import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import sqlite3
+import atexit
+import threading
+import time
+import random
+import re
+import math
+import bisect
+import heapq
+import itertools
+from collections import Counter, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+# gspread, google-auth, smtplib and the email modules are imported where they are first
+# used, so the login page renders without paying for them
+
+# Sessions hold shallow copies of the shared tables; with Copy-on-Write an edit copies only
+# the columns it touches instead of the whole table (always on from pandas 3)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 st.set_page_config(page_title="Lyns Real Estate CRM", page_icon="🏠", layout="wide")
 
@@ -27,32 +44,84 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# Google Sheets Integration
+# Google Sheets Integration. One authorized client per service account is shared by every
+# session: its access token is refreshed in the background before it expires, and its
+# HTTP connections are kept alive between requests.
+SHEETS_SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+SHEETS_TOKEN_MARGIN = 300  # seconds before expiry at which the access token is refreshed
+SHEETS_TOKEN_RETRY = 30  # seconds between attempts when a refresh fails
+SHEETS_POOL_SIZE = 16  # keep-alive connections to the Google APIs, shared by all sessions
+
+class _TokenRefresher:
+    def __init__(self, credentials):
+        from google.auth.transport.requests import Request
+        self.credentials = credentials
+        self._request = Request()
+        self._lock = threading.Lock()
+        self.refresh()
+        threading.Thread(target=self._run, name='sheets-token-refresh', daemon=True).start()
+    
+    def refresh(self):
+        # Requests keep using the current token until the new one is in place
+        with self._lock:
+            self.credentials.refresh(self._request)
+    
+    def seconds_left(self):
+        expiry = self.credentials.expiry  # naive UTC, as google-auth stores it
+        if expiry is None:
+            return 0
+        return (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+    
+    def _run(self):
+        while True:
+            time.sleep(max(self.seconds_left() - SHEETS_TOKEN_MARGIN, 1))
+            try:
+                self.refresh()
+            except Exception:
+                time.sleep(SHEETS_TOKEN_RETRY)
+
+@st.cache_resource
+def _sheets_client(account):
+    # `account` is the service account key as JSON, or the path of the key file
+    import gspread
+    from google.auth.transport.requests import AuthorizedSession
+    from google.oauth2.service_account import Credentials
+    from requests.adapters import HTTPAdapter
+    if account.lstrip().startswith('{'):
+        credentials = Credentials.from_service_account_info(json.loads(account), scopes=SHEETS_SCOPE)
+    else:
+        credentials = Credentials.from_service_account_file(account, scopes=SHEETS_SCOPE)
+    _TokenRefresher(credentials)
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=SHEETS_POOL_SIZE, pool_maxsize=SHEETS_POOL_SIZE)
+    session.mount('https://', adapter)
+    return gspread.Client(credentials, session=session)
+
+def _has_secret(name):
+    # st.secrets raises when there is no secrets file at all
+    try:
+        return name in st.secrets
+    except Exception:
+        return False
+
 def init_google_sheets():
     try:
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        
-        # Check if running on Streamlit Cloud (secrets available) or locally
-        try:
-            if 'gcp_service_account' in st.secrets:
-                # Running on Streamlit Cloud - use secrets
-                creds_dict = dict(st.secrets['gcp_service_account'])
-                creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-                client = gspread.authorize(creds)
-                
-                config = {
-                    'users_sheet_id': st.secrets['sheets']['users_sheet_id'],
-                    'clients_sheet_id': st.secrets['sheets']['clients_sheet_id'],
-                    'listings_sheet_id': st.secrets['sheets']['listings_sheet_id'],
-                    'deals_sheet_id': st.secrets['sheets']['deals_sheet_id']
-                }
-                return client, config
-        except:
-            pass
+        # Check if running on Streamlit Cloud (secrets available) or locally. Errors on the
+        # secrets path are reported, not passed over for the local key file.
+        if _has_secret('gcp_service_account'):
+            # Running on Streamlit Cloud - use secrets
+            client = _sheets_client(json.dumps(dict(st.secrets['gcp_service_account']), sort_keys=True))
+            
+            config = {
+                'users_sheet_id': st.secrets['sheets']['users_sheet_id'],
+                'clients_sheet_id': st.secrets['sheets']['clients_sheet_id'],
+                'listings_sheet_id': st.secrets['sheets']['listings_sheet_id'],
+                'deals_sheet_id': st.secrets['sheets']['deals_sheet_id']
+            }
+            return client, config
         
         # Running locally - use files
-        creds = ServiceAccountCredentials.from_json_keyfile_name('google_credentials.json', scope)
-        client = gspread.authorize(creds)
+        client = _sheets_client('google_credentials.json')
         
         with open('sheets_config.json', 'r') as f:
             config = json.load(f)
@@ -63,53 +132,1091 @@ def init_google_sheets():
         return None, None
 
 
-def send_email_notification(to_email, subject, body):
+# Notifications are written to a local outbox first; background workers deliver them with retries
+OUTBOX_PATH = 'notification_outbox.db'
+OUTBOX_WORKERS = 2  # concurrent SMTP connections
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF = 30  # seconds before the first retry, doubled after every failure
+OUTBOX_MAX_BACKOFF = 3600
+OUTBOX_RETENTION = 30  # days a sent message is kept, and its key remembered
+SMTP_IDLE_TIMEOUT = 120  # seconds before an unused connection is closed
+
+class _SmtpConnection:
+    def __init__(self):
+        self._server = None
+        self._settings = None
+        self.last_used = None
+    
+    def _connect(self, settings):
+        import smtplib
+        self.close()
+        server = smtplib.SMTP(settings['smtp_server'], settings['smtp_port'], timeout=30)
+        server.starttls()
+        server.login(settings['sender_email'], settings['sender_password'])
+        self._server, self._settings = server, settings
+    
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+        self._server = self._settings = self.last_used = None
+    
+    def deliver(self, settings, message):
+        import smtplib
+        if self._server is None or self._settings != settings:
+            self._connect(settings)
+        try:
+            self._server.send_message(message)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused, OSError):
+            # The server dropped the idle connection; reconnect and try once more
+            self._connect(settings)
+            self._server.send_message(message)
+        self.last_used = time.monotonic()
+
+def _email_settings():
+    try:
+        if 'email' not in st.secrets:
+            return None
+        return {key: st.secrets['email'][key]
+                for key in ('smtp_server', 'smtp_port', 'sender_email', 'sender_password')}
+    except Exception:
+        return None
+
+def _email_message(settings, to_email, subject, body):
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    msg = MIMEMultipart()
+    msg['From'] = f"Lyns Estate Agency <{settings['sender_email']}>"
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'html'))
+    return msg
+
+class _NotificationOutbox:
+    def __init__(self, path, workers=OUTBOX_WORKERS):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS outbox (
+            key TEXT PRIMARY KEY, to_email TEXT, subject TEXT, body TEXT,
+            status TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0, next_attempt REAL DEFAULT 0,
+            last_error TEXT, created TEXT, sent TEXT)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+        # Messages claimed by a previous process that never finished go back in line
+        self._db.execute("UPDATE outbox SET status='pending' WHERE status='sending'")
+        self._db.commit()
+        self._cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f'email-outbox-{i}', daemon=True).start()
+        atexit.register(self.flush)
+    
+    def enqueue(self, key, to_email, subject, body):
+        # The key makes repeated submits of the same notification a no-op
+        with self._cond:
+            cutoff = (datetime.now() - timedelta(days=OUTBOX_RETENTION)).isoformat(timespec='seconds')
+            self._db.execute("DELETE FROM outbox WHERE status='sent' AND sent < ?", (cutoff,))
+            added = self._db.execute(
+                "INSERT OR IGNORE INTO outbox (key, to_email, subject, body, created) VALUES (?, ?, ?, ?, ?)",
+                (key, to_email, subject, body, datetime.now().isoformat(timespec='seconds'))).rowcount
+            self._db.commit()
+            self._cond.notify()
+        return bool(added)
+    
+    def counts(self):
+        with self._cond:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+    
+    def last_failure(self):
+        with self._cond:
+            row = self._db.execute("SELECT to_email, last_error FROM outbox WHERE status='failed' "
+                                   "ORDER BY rowid DESC LIMIT 1").fetchone()
+        return f"{row[0]}: {row[1]}" if row else None
+    
+    def pending(self):
+        counts = self.counts()
+        return counts.get('pending', 0) + counts.get('sending', 0)
+    
+    def retry_failed(self):
+        with self._cond:
+            self._db.execute("UPDATE outbox SET status='pending', attempts=0, next_attempt=0 WHERE status='failed'")
+            self._db.commit()
+            self._cond.notify_all()
+    
+    def flush(self, timeout=30):
+        # Waits for messages that are due now; ones backing off after a failure stay queued
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while time.monotonic() < deadline and self._db.execute(
+                    "SELECT 1 FROM outbox WHERE status='sending' OR (status='pending' AND next_attempt<=?) LIMIT 1",
+                    (time.time(),)).fetchone():
+                self._cond.wait(min(0.5, max(0, deadline - time.monotonic())))
+    
+    def _claim(self):
+        with self._cond:
+            row = self._db.execute(
+                "SELECT key, to_email, subject, body, attempts FROM outbox "
+                "WHERE status='pending' AND next_attempt<=? ORDER BY rowid LIMIT 1", (time.time(),)).fetchone()
+            if row:
+                self._db.execute("UPDATE outbox SET status='sending' WHERE key=?", (row[0],))
+                self._db.commit()
+            return row
+    
+    def _finish(self, key, attempts, error=None):
+        with self._cond:
+            if error is None:
+                self._db.execute("UPDATE outbox SET status='sent', attempts=?, last_error=NULL, sent=? WHERE key=?",
+                                 (attempts, datetime.now().isoformat(timespec='seconds'), key))
+            else:
+                delay = min(OUTBOX_BACKOFF * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF) * random.uniform(0.5, 1)
+                status = 'failed' if attempts >= OUTBOX_MAX_ATTEMPTS else 'pending'
+                self._db.execute("UPDATE outbox SET status=?, attempts=?, next_attempt=?, last_error=? WHERE key=?",
+                                 (status, attempts, time.time() + delay, error, key))
+            self._db.commit()
+            self._cond.notify_all()
+    
+    def _wait(self):
+        with self._cond:
+            due = self._db.execute("SELECT MIN(next_attempt) FROM outbox WHERE status='pending'").fetchone()[0]
+            timeout = SMTP_IDLE_TIMEOUT if due is None else min(max(due - time.time(), 0.05), SMTP_IDLE_TIMEOUT)
+            self._cond.wait(timeout)
+    
+    def _run(self):
+        connection = _SmtpConnection()
+        while True:
+            job = self._claim()
+            if job is None:
+                if connection.last_used and time.monotonic() - connection.last_used > SMTP_IDLE_TIMEOUT:
+                    connection.close()
+                self._wait()
+                continue
+            key, to_email, subject, body, attempts = job
+            try:
+                settings = _email_settings()
+                if settings is None:
+                    raise RuntimeError("email settings are not configured")
+                connection.deliver(settings, _email_message(settings, to_email, subject, body))
+                self._finish(key, attempts + 1)
+            except Exception as e:
+                connection.close()
+                self._finish(key, attempts + 1, str(e))
+
+@st.cache_resource
+def _notification_outbox():
+    return _NotificationOutbox(OUTBOX_PATH)
+
+def send_email_notification(to_email, subject, body, key=None):
     try:
         # Check if email settings are configured
-        if not hasattr(st, 'secrets') or 'email' not in st.secrets:
+        if _email_settings() is None:
             return False
         
-        smtp_server = st.secrets['email']['smtp_server']
-        smtp_port = st.secrets['email']['smtp_port']
-        sender_email = st.secrets['email']['sender_email']
-        sender_password = st.secrets['email']['sender_password']
-        
-        msg = MIMEMultipart()
-        msg['From'] = f"Lyns Estate Agency <{sender_email}>"
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'html'))
-        
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.send_message(msg)
-        server.quit()
-        
+        if key is None:
+            # Without a key naming the action, every call is a separate notification
+            key = uuid.uuid4().hex
+        _notification_outbox().enqueue(key, to_email, subject, body)
         return True
     except Exception as e:
         st.error(f"Email notification failed: {e}")
         return False
 
-def load_from_sheets(client, sheet_id, sheet_name="Sheet1"):
+# One authoritative copy of each worksheet, shared by every session in this process.
+# Sessions get shallow copies of it, so reading a table costs no memory per session.
+class _ReadWriteLock:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+    
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+    
+    @contextmanager
+    def write(self):
+        with self._cond:
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+@st.cache_resource
+def _shared_tables():
+    return {'lock': _ReadWriteLock(), 'frames': {}, 'appended': {}, 'schemas': {}, 'versions': {}, 'changes': {},
+            'loading': {}}
+
+# How many versions of each shared table remember which rows they changed
+SHARED_CHANGE_LOG = 500
+
+def _bump_version(tables, key, keys=None):
+    # Called with the write lock held. `keys` are the rows the new version changed; None
+    # when the whole table was replaced or dropped
+    version = tables['versions'][key] = tables['versions'].get(key, 0) + 1
+    log = tables['changes'].setdefault(key, {})
+    log[version] = None if keys is None else set(keys)
+    log.pop(version - SHARED_CHANGE_LOG, None)
+
+def shared_changes_since(key, version):
+    # Keys of the rows changed after `version`, or None if the log doesn't say
+    tables = _shared_tables()
+    with tables['lock'].read():
+        current = tables['versions'].get(key, 0)
+        log = tables['changes'].get(key, {})
+        if version is None or version > current:
+            return None
+        keys = set()
+        for v in range(version + 1, current + 1):
+            if log.get(v) is None:
+                return None
+            keys |= log[v]
+        return keys
+
+def shared_version(sheet_id, sheet_name="Sheet1"):
+    tables = _shared_tables()
+    with tables['lock'].read():
+        return tables['versions'].get((sheet_id, sheet_name), 0)
+
+def _shared_frame(key):
+    tables = _shared_tables()
+    with tables['lock'].read():
+        df = tables['frames'].get(key)
+        if df is None or not tables['appended'].get(key):
+            return None if df is None else df.copy(deep=False)
+    with tables['lock'].write():
+        df = _fold_appended(tables, key)
+        return None if df is None else df.copy(deep=False)
+
+def _fold_appended(tables, key):
+    # Called with the write lock held
+    df = tables['frames'].get(key)
+    records = tables['appended'].pop(key, None)
+    if df is not None and records:
+        df = tables['frames'][key] = _with_appended(df, records, tables['schemas'].get(key))
+    return df
+
+def _with_appended(df, records, table=None):
+    # New rows are labelled past the existing ones, so no row's label ever changes
+    start = int(df.index.max()) + 1 if len(df) else 0
+    new_rows = pd.DataFrame(records, index=range(start, start + len(records)))
+    if table:
+        # Conform on a shallow copy; sessions may still hold the previous frame
+        df = df.copy(deep=False)
+        new_rows = _conform(table, df, new_rows)
+    return pd.concat([df, new_rows])
+
+def _shared_put(key, df):
+    tables = _shared_tables()
+    with tables['lock'].write():
+        tables['frames'][key] = df.copy(deep=False)
+        tables['appended'].pop(key, None)
+        _bump_version(tables, key)
+
+class WriteConflict(Exception):
+    # Rows being saved were changed or deleted by someone else since this session read them
+    def __init__(self, table, keys):
+        self.table, self.keys = table, list(keys)
+        super().__init__(f"{', '.join(map(str, self.keys))} in {table} changed by another user")
+
+def _row_version(value):
+    return 0 if pd.isna(value) else int(value)
+
+def _shared_commit(changes, check=True, then=None):
+    # Compare-and-set on the shared copies, for several tables at once. `changes` maps each
+    # shared key to its table and change: 'rows' holds edited rows and 'deleted' maps deleted
+    # keys to versions, each at the Row_Version this session read; 'appended' holds new rows.
+    # If any edited or deleted row has moved on since, nothing is applied and WriteConflict
+    # names the rows; otherwise edited rows go in with their version bumped. `then` gets the
+    # new frames while the lock is still held, so saves are queued in commit order. Returns
+    # {key: new frame} for the loaded tables that had rows edited or deleted.
+    plans = {}
+    for key, (table, change) in changes.items():
+        rows = change.get('rows')
+        rows = pd.DataFrame() if rows is None else rows
+        read_at = rows[ROW_VERSION].tolist() if ROW_VERSION in rows else [0] * len(rows)
+        expected = dict(zip(rows[TABLE_KEYS[table]].tolist(), map(_row_version, read_at))) if len(rows) else {}
+        plans[key] = (table, rows, expected, change.get('deleted') or {}, change.get('appended') or [])
+    tables = _shared_tables()
+    with tables['lock'].write():
+        labels, candidates = {}, {}
+        for key, (table, rows, expected, deleted, appended) in plans.items():
+            if check and appended and key in tables['frames']:
+                # IDs are numbered by each session, so two sessions may hand out the same one
+                key_column = TABLE_KEYS[table]
+                new_keys = {record.get(key_column) for record in appended}
+                existing = tables['frames'][key][key_column] if key_column in tables['frames'][key] else pd.Series()
+                taken = set(existing[existing.isin(list(new_keys))].tolist())
+                taken |= new_keys & {record.get(key_column) for record in tables['appended'].get(key, [])}
+                if taken:
+                    raise WriteConflict(table, sorted(taken))
+            if not (expected or deleted) or key not in tables['frames']:
+                continue
+            # Rows added in the same commit may be edited in it too; they are only stored once
+            # nothing conflicts
+            df = _fold_appended(tables, key)
+            if appended:
+                df = _with_appended(df, appended, table)
+            candidates[key] = df
+            ids = df[TABLE_KEYS[table]]
+            matches = ids.isin(list(expected) + list(deleted))
+            labels[key] = dict(zip(ids[matches].tolist(), ids.index[matches].tolist()))
+            if check:
+                def version_of(k):
+                    return _row_version(df.at[labels[key][k], ROW_VERSION]) if ROW_VERSION in df else 0
+                conflicts = [k for k, version in expected.items() if k not in labels[key] or version_of(k) != version]
+                conflicts += [k for k, version in deleted.items() if k in labels[key] and version_of(k) != version]
+                if conflicts:
+                    raise WriteConflict(table, conflicts)
+        frames = {}
+        for key, (table, rows, expected, deleted, appended) in plans.items():
+            changed = [*expected, *deleted, *(record.get(TABLE_KEYS[table]) for record in appended)]
+            if key not in labels:
+                if appended and key in tables['frames']:
+                    tables['appended'].setdefault(key, []).extend(appended)
+                    tables['schemas'][key] = table
+                _bump_version(tables, key, changed if key in tables['frames'] else None)
+                continue
+            df = candidates[key].copy(deep=False)
+            key_column = TABLE_KEYS[table]
+            columns = [column for column in rows.columns if column != ROW_VERSION]
+            for row in rows[columns].to_numpy(dtype=object) if len(rows) else []:
+                label = labels[key].get(row[columns.index(key_column)])
+                if label is None:
+                    continue
+                # Only the cells that differ are written, so copy-on-write copies just those columns
+                for column, value in zip(columns, row):
+                    if column in df:
+                        current = df.at[label, column]
+                        if pd.isna(current) and pd.isna(value) or not pd.isna(current) and not pd.isna(value) and current == value:
+                            continue
+                    _set_cell(df, label, column, value)
+                _set_cell(df, label, ROW_VERSION, expected[row[columns.index(key_column)]] + 1)
+            if deleted:
+                df = df.drop([labels[key][k] for k in deleted if k in labels[key]])
+            tables['frames'][key] = df
+            _bump_version(tables, key, changed)
+            frames[key] = df.copy(deep=False)
+        if then:
+            then(frames)
+        return frames
+
+def invalidate_shared(sheet_id, sheet_name="Sheet1"):
+    tables = _shared_tables()
+    with tables['lock'].write():
+        tables['frames'].pop((sheet_id, sheet_name), None)
+        tables['appended'].pop((sheet_id, sheet_name), None)
+        _bump_version(tables, (sheet_id, sheet_name))
+
+
+# Every Google Sheets request goes through one scheduler per process. Reads and writes are
+# each held to the per-minute quota over a sliding 60 s window, the way Google counts it, so a
+# sign-in's dozen reads go out at once; within a kind, requests made for writes go first and
+# background reloads last. 429s and 5xx errors are retried with jittered exponential backoff
+# instead of failing the save.
+SHEETS_QUOTA = {'read': 60, 'write': 60}  # requests per minute; None for no limit
+SHEETS_WINDOW = 60  # seconds
+SHEETS_PRIORITIES = {'write': 0, 'read': 1, 'refresh': 2}
+SHEETS_MAX_ATTEMPTS = 6
+SHEETS_BACKOFF = 1.0  # seconds before the first retry, doubled after every failure
+SHEETS_MAX_BACKOFF = 32
+
+_sheets_context = threading.local()
+
+@contextmanager
+def sheets_priority(level):
+    # Requests made on this thread inside the block queue at this priority
+    previous = getattr(_sheets_context, 'priority', None)
+    _sheets_context.priority = SHEETS_PRIORITIES[level]
     try:
-        sheet = client.open_by_key(sheet_id).worksheet(sheet_name)
-        data = sheet.get_all_records()
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except Exception as e:
-        return pd.DataFrame()
-
-def save_to_sheets(client, sheet_id, df, sheet_name="Sheet1"):
+        yield
+    finally:
+        _sheets_context.priority = previous
+
+class _SheetsScheduler:
+    def __init__(self, quota):
+        self._cond = threading.Condition()
+        self._windows = {kind: {'limit': per_minute, 'sent': deque()} for kind, per_minute in quota.items()}
+        self._waiting = {kind: [] for kind in quota}
+        self._backing_off = Counter()
+        self._order = itertools.count()
+        self.stats = Counter()
+    
+    def _expire(self, window):
+        # Forget requests that have left the window
+        now = time.monotonic()
+        while window['sent'] and window['sent'][0] <= now - SHEETS_WINDOW:
+            window['sent'].popleft()
+        return now
+    
+    def _acquire(self, kind, priority):
+        window, waiting = self._windows[kind], self._waiting[kind]
+        if not window['limit']:
+            return
+        with self._cond:
+            ticket = (priority, next(self._order))
+            heapq.heappush(waiting, ticket)
+            try:
+                while True:
+                    now = self._expire(window)
+                    if waiting[0] == ticket and len(window['sent']) < window['limit']:
+                        window['sent'].append(now)
+                        return
+                    # The first in line sleeps until the oldest request leaves the window;
+                    # the rest until it has gone out
+                    first = waiting[0] == ticket
+                    self._cond.wait(window['sent'][0] + SHEETS_WINDOW - now if first else None)
+            finally:
+                waiting.remove(ticket)
+                heapq.heapify(waiting)
+                self._cond.notify_all()
+    
+    def call(self, kind, request, idempotent=True):
+        import gspread
+        priority = getattr(_sheets_context, 'priority', None)
+        if priority is None:
+            priority = SHEETS_PRIORITIES[kind]
+        for attempt in range(SHEETS_MAX_ATTEMPTS):
+            self._acquire(kind, priority)
+            try:
+                return request()
+            except (gspread.exceptions.APIError, OSError) as e:
+                # OSError covers dropped connections and timeouts from requests
+                status = e.response.status_code if isinstance(e, gspread.exceptions.APIError) else None
+                retryable = status == 429 or idempotent and (status is None or status >= 500)
+                if not retryable or attempt + 1 == SHEETS_MAX_ATTEMPTS:
+                    raise
+                with self._cond:
+                    self.stats['throttled' if status == 429 else 'retried'] += 1
+                    window = self._windows[kind]
+                    if status == 429 and window['limit']:
+                        # Over quota after all (other processes share it): treat the window as
+                        # full, so everyone waits for the oldest request to leave it
+                        now = self._expire(window)
+                        window['sent'].extend([now] * (window['limit'] - len(window['sent'])))
+                    self._backing_off[kind] += 1
+            try:
+                time.sleep(min(SHEETS_MAX_BACKOFF, SHEETS_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1))
+            finally:
+                with self._cond:
+                    self._backing_off[kind] -= 1
+    
+    def depth(self):
+        # Requests waiting for a token or backing off before a retry, by kind
+        with self._cond:
+            return {kind: len(waiting) + self._backing_off[kind] for kind, waiting in self._waiting.items()}
+
+@st.cache_resource
+def _sheets_scheduler():
+    return _SheetsScheduler(SHEETS_QUOTA)
+
+def sheets_read(method, *args, **kwargs):
+    return _sheets_scheduler().call('read', lambda: method(*args, **kwargs))
+
+def sheets_write(method, *args, **kwargs):
+    # Safe to repeat: the same cells end up with the same values
+    return _sheets_scheduler().call('write', lambda: method(*args, **kwargs))
+
+def sheets_write_once(method, *args, **kwargs):
+    # For appends and row deletes: a server error may come after the change went in, so
+    # only quota rejections (which never ran) are retried
+    return _sheets_scheduler().call('write', lambda: method(*args, **kwargs), idempotent=False)
+
+
+# Open worksheet handles, shared across sessions so reads and writes skip the metadata fetch
+WORKSHEET_HANDLE_TTL = 600  # seconds
+
+@st.cache_resource
+def _worksheet_handles():
+    return {'lock': threading.Lock(), 'handles': {}}
+
+def open_worksheet(client, sheet_id, sheet_name="Sheet1", refresh=False):
+    handles = _worksheet_handles()
+    key = (sheet_id, sheet_name)
+    with handles['lock']:
+        entry = handles['handles'].get(key)
+    if entry and not refresh and time.monotonic() - entry[1] < WORKSHEET_HANDLE_TTL:
+        return entry[0]
+    sheet = sheets_read(sheets_read(client.open_by_key, sheet_id).worksheet, sheet_name)
+    with handles['lock']:
+        handles['handles'][key] = (sheet, time.monotonic())
+    return sheet
+
+def _on_worksheet(client, sheet_id, sheet_name, action):
+    import gspread
     try:
-        sheet = client.open_by_key(sheet_id).worksheet(sheet_name)
-        sheet.clear()
-        if not df.empty:
-            sheet.update([df.columns.values.tolist()] + df.values.tolist())
-        return True
-    except Exception as e:
-        st.error(f"Error saving to sheets: {e}")
-        return False
+        return action(open_worksheet(client, sheet_id, sheet_name))
+    except gspread.exceptions.APIError as e:
+        if e.response.status_code not in (400, 404):
+            raise
+        # The cached handle has gone stale (tab renamed, deleted or recreated), so reopen once
+        return action(open_worksheet(client, sheet_id, sheet_name, refresh=True))
+
+def _load_shared(key, fetch):
+    df = _shared_frame(key)
+    if df is not None:
+        return df
+    
+    # Only one session reads a given table from its backend at a time
+    tables = _shared_tables()
+    with tables['lock'].write():
+        loading = tables['loading'].setdefault(key, threading.Lock())
+    with loading:
+        df = _shared_frame(key)
+        if df is not None:
+            return df
+        df = fetch()
+        with tables['lock'].write():
+            tables['frames'][key] = df.copy(deep=False)
+        return df
+
+def load_from_sheets(client, sheet_id, sheet_name="Sheet1", table=None):
+    def fetch():
+        # As text: TABLE_SCHEMAS types the columns, and phone numbers keep their leading 0
+        data = _on_worksheet(client, sheet_id, sheet_name,
+                             lambda sheet: sheets_read(sheet.get_all_records, numericise_ignore=['all']))
+        df = pd.DataFrame(data) if data else pd.DataFrame()
+        # Typed once here, so every session shares the converted columns
+        df = apply_schema(table, df) if table else df
+        # Recorded as the app would write it, so the next diff only sees real changes
+        _remember_synced(sheet_id, sheet_name, df)
+        return df
+    
+    try:
+        return _load_shared((sheet_id, sheet_name), fetch)
+    except Exception:
+        # None rather than an empty frame, so a failed read is never taken for an empty sheet
+        return None
+
+
+# Last values known to be in each worksheet, so saves can send only what changed
+@st.cache_resource
+def _synced_snapshots():
+    return {'lock': threading.Lock(), 'rows': {}, 'locks': {}}
+
+def _snapshot_lock(key):
+    # One lock per worksheet: saves to a sheet go one at a time, as each diffs against the
+    # snapshot the last one left, while loads and saves of other sheets don't wait on them
+    snapshots = _synced_snapshots()
+    with snapshots['lock']:
+        return snapshots['locks'].setdefault(key, threading.Lock())
+
+def _cell(value):
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return ''
+    if isinstance(value, (pd.Timestamp, datetime)):
+        # Typed date columns go back out in the format the app writes them in
+        return value.strftime('%Y-%m-%d') if value.time() == datetime.min.time() else value.isoformat(sep=' ')
+    if hasattr(value, 'item'):
+        value = value.item()
+    return value
+
+def _frame_rows(df):
+    return [list(df.columns)] + [[_cell(v) for v in row] for row in df.itertuples(index=False, name=None)]
+
+def _remember_synced(sheet_id, sheet_name, df):
+    rows = _frame_rows(df) if len(df.columns) else None
+    with _snapshot_lock((sheet_id, sheet_name)):
+        _synced_snapshots()['rows'][(sheet_id, sheet_name)] = rows
+
+def _cell_data(value):
+    if isinstance(value, bool):
+        return {'userEnteredValue': {'boolValue': value}}
+    if isinstance(value, (int, float)):
+        return {'userEnteredValue': {'numberValue': value}}
+    return {'userEnteredValue': {'stringValue': str(value)}}
+
+def _row_data(values):
+    return {'values': [_cell_data(v) for v in values]}
+
+def _diff_requests(worksheet_id, old_rows, new_rows):
+    # Returns the batchUpdate requests turning old_rows into new_rows, or None when
+    # the change is structural (header change, duplicate keys, reordered rows)
+    if not old_rows or old_rows[0] != new_rows[0]:
+        return None
+    old_keys = [r[0] for r in old_rows[1:]]
+    new_keys = [r[0] for r in new_rows[1:]]
+    if len(set(old_keys)) != len(old_keys) or len(set(new_keys)) != len(new_keys):
+        return None
+    new_key_set = set(new_keys)
+    kept = [i for i, k in enumerate(old_keys) if k in new_key_set]
+    if new_keys[:len(kept)] != [old_keys[i] for i in kept]:
+        return None
+    
+    requests = []
+    # Delete from the bottom up so earlier row indexes stay valid
+    for i in reversed(range(len(old_keys))):
+        if old_keys[i] not in new_key_set:
+            requests.append({'deleteDimension': {'range': {
+                'sheetId': worksheet_id, 'dimension': 'ROWS', 'startIndex': i + 1, 'endIndex': i + 2}}})
+    
+    # Changed cells in surviving rows, one contiguous span per row
+    for pos, old_i in enumerate(kept):
+        old_row, new_row = old_rows[old_i + 1], new_rows[pos + 1]
+        changed = [c for c in range(len(new_row)) if c >= len(old_row) or old_row[c] != new_row[c]]
+        if changed:
+            first, last = changed[0], changed[-1]
+            requests.append({'updateCells': {
+                'start': {'sheetId': worksheet_id, 'rowIndex': pos + 1, 'columnIndex': first},
+                'rows': [_row_data(new_row[first:last + 1])],
+                'fields': 'userEnteredValue'}})
+    
+    appended = new_rows[len(kept) + 1:]
+    if appended:
+        requests.append({'appendCells': {
+            'sheetId': worksheet_id, 'rows': [_row_data(r) for r in appended], 'fields': 'userEnteredValue'}})
+    return requests
+
+def _keys_match(sheet, old_rows):
+    # Row positions in the snapshot only hold if nobody has added, removed or sorted rows
+    # in the sheet itself since
+    return sheets_read(sheet.col_values, 1) == [_display_key(row[0]) for row in old_rows]
+
+def _display_key(value):
+    # As Sheets shows the value, which is what col_values returns
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _write_rows(client, sheet_id, df, sheet_name="Sheet1"):
+    key = (sheet_id, sheet_name)
+    new_rows = _frame_rows(df)
+    snapshots = _synced_snapshots()
+    
+    def write(sheet):
+        import gspread
+        old_rows = snapshots['rows'].get(key)
+        requests = _diff_requests(sheet.id, old_rows, new_rows)
+        if requests and any('appendCells' not in r for r in requests) and not _keys_match(sheet, old_rows):
+            requests = None
+        if requests is None:
+            # No usable snapshot: overwrite in place, then trim leftover rows
+            sheets_write(sheet.update, new_rows)
+            last_col = gspread.utils.rowcol_to_a1(1, max(sheet.col_count, len(new_rows[0])))[:-1]
+            sheets_write(sheet.batch_clear, [f"A{len(new_rows) + 1}:{last_col}"])
+        elif requests:
+            sheets_write_once(sheet.spreadsheet.batch_update, {'requests': requests})
+    
+    try:
+        with _snapshot_lock(key), sheets_priority('write'):
+            _on_worksheet(client, sheet_id, sheet_name, write)
+            snapshots['rows'][key] = new_rows
+    except Exception:
+        # The sheet may be half-written now, so the next save rewrites it in full
+        _remember_synced(sheet_id, sheet_name, pd.DataFrame())
+        raise
+
+def _append_rows(client, sheet_id, df, sheet_name="Sheet1"):
+    key = (sheet_id, sheet_name)
+    snapshots = _synced_snapshots()
+    
+    def append(sheet):
+        old_rows = snapshots['rows'].get(key)
+        header = old_rows[0] if old_rows else sheets_read(sheet.row_values, 1)
+        if not header:
+            # Empty worksheet: the header goes in with the first rows
+            new_rows = _frame_rows(df)
+            sheets_write_once(sheet.append_rows, new_rows, value_input_option='RAW')
+            snapshots['rows'][key] = new_rows
+            return
+        if not set(df.columns) <= set(header):
+            raise ValueError(f"columns {sorted(set(df.columns) - set(header))} are not in the sheet")
+        new_rows = _frame_rows(df.reindex(columns=header))[1:]
+        sheets_write_once(sheet.append_rows, new_rows, value_input_option='RAW', table_range='A1')
+        if old_rows:
+            old_rows.extend(new_rows)
+    
+    with _snapshot_lock(key), sheets_priority('write'):
+        _on_worksheet(client, sheet_id, sheet_name, append)
+
+
+# Sheet writes happen on a background thread so the UI never waits on the Google API
+WRITE_BEHIND_WINDOW = 1.0  # seconds to wait for further edits before flushing
+
+class _WriteBehindQueue:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._in_flight = 0
+        self._flushing = False
+        self._errors = {}
+        threading.Thread(target=self._run, name='sheets-write-behind', daemon=True).start()
+        atexit.register(self.flush)
+    
+    def _entry(self, client, sheet_id, sheet_name):
+        entry = self._pending.setdefault((sheet_id, sheet_name), {'frame': None, 'rows': [], 'edits': 0})
+        entry['client'] = client
+        entry['edits'] += 1
+        self._cond.notify_all()
+        return entry
+    
+    def save(self, client, sheet_id, df, sheet_name="Sheet1"):
+        self.commit(client, [(sheet_id, sheet_name, df, None)])
+    
+    def append(self, client, sheet_id, records, sheet_name="Sheet1"):
+        self.commit(client, [(sheet_id, sheet_name, None, records)])
+    
+    def commit(self, client, writes):
+        # Each write is (sheet_id, sheet_name, frame to save or None, records to append).
+        # They're queued together, so the worker sends them in the same batch.
+        with self._cond:
+            for sheet_id, sheet_name, df, records in writes:
+                entry = self._entry(client, sheet_id, sheet_name)
+                if df is not None:
+                    # A newer copy of the table replaces anything still waiting for that sheet
+                    entry['frame'] = df.copy(deep=False)
+                    entry['rows'] = []
+                elif entry['frame'] is not None:
+                    entry['frame'] = pd.concat([entry['frame'], pd.DataFrame(records)], ignore_index=True)
+                else:
+                    entry['rows'].extend(records)
+    
+    def pending(self):
+        with self._cond:
+            return sum(entry['edits'] for entry in self._pending.values()) + self._in_flight
+    
+    def errors(self):
+        # The last failed save of each sheet; the worker updates these as saves finish
+        with self._cond:
+            return list(self._errors.values())
+    
+    def flush(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            while (self._pending or self._in_flight) and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            self._flushing = False
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Let quick successive edits to the same sheet merge into one write
+                self._cond.wait_for(lambda: self._flushing, timeout=WRITE_BEHIND_WINDOW)
+                batch, self._pending = self._pending, {}
+                self._in_flight = sum(entry['edits'] for entry in batch.values())
+            for (sheet_id, sheet_name), entry in batch.items():
+                try:
+                    if entry['frame'] is not None:
+                        _write_rows(entry['client'], sheet_id, entry['frame'], sheet_name)
+                    else:
+                        _append_rows(entry['client'], sheet_id, pd.DataFrame(entry['rows']), sheet_name)
+                    error = None
+                except Exception as e:
+                    # Other sessions re-read the sheet instead of trusting the unsaved copy
+                    invalidate_shared(sheet_id, sheet_name)
+                    error = str(e)
+                with self._cond:
+                    self._in_flight -= entry['edits']
+                    if error:
+                        self._errors[(sheet_id, sheet_name)] = error
+                    else:
+                        self._errors.pop((sheet_id, sheet_name), None)
+                    self._cond.notify_all()
+
+@st.cache_resource
+def _write_queue():
+    return _WriteBehindQueue()
+
+# Storage backends. The app reads and writes whole tables through one of these. commit()
+# takes {table: change}, where a change has the session's frame ('df'), new rows
+# ('appended'), the keys of edited rows ('updated') and deleted keys mapped to their
+# Row_Version ('deleted'). Edited and deleted rows are compare-and-set against the stored
+# ones, and a mismatch on any of them raises WriteConflict with nothing saved.
+def _shared_changes(storage, changes):
+    # commit() changes in the form _shared_commit takes
+    shared = {}
+    for table, change in changes.items():
+        rows = None
+        if change.get('updated'):
+            rows = change['df'][change['df'][TABLE_KEYS[table]].isin(change['updated'])]
+        shared[storage.key(table)] = (table, {'rows': rows, 'deleted': change.get('deleted'),
+                                              'appended': change.get('appended')})
+    return shared
+
+class SheetsStorage:
+    def __init__(self, client, config):
+        self.client = client
+        self.config = config
+    
+    def describe(self):
+        return "Google Sheets"
+    
+    def key(self, table):
+        return (self.config[TABLE_SHEETS[table]], "Sheet1")
+    
+    def load(self, table):
+        return load_from_sheets(self.client, *self.key(table), table=table)
+    
+    def queue_save(self, table, df):
+        sheet_id, sheet_name = self.key(table)
+        _write_queue().save(self.client, sheet_id, df, sheet_name)
+    
+    def queue_append(self, table, records):
+        sheet_id, sheet_name = self.key(table)
+        _write_queue().append(self.client, sheet_id, records, sheet_name)
+    
+    def save(self, table, df):
+        self.queue_save(table, df)
+        _shared_put(self.key(table), df)
+    
+    def queue_writes(self, writes):
+        # (table, frame to save or None, records to append), sent to the sheets in one batch
+        _write_queue().commit(self.client, [(*self.key(table), df, records) for table, df, records in writes])
+    
+    def append(self, table, records):
+        self.commit({table: {'appended': records}})
+    
+    def update(self, table, df, keys):
+        self.commit({table: {'df': df, 'updated': keys}})
+    
+    def delete(self, table, df, keys):
+        self.commit({table: {'df': df, 'deleted': keys}})
+    
+    def commit(self, changes):
+        # Versions are checked against this process's copy of each sheet, which every write goes
+        # through. The merged tables are queued as one batch, and _write_rows sends only the
+        # changed cells. Sheets can't share a transaction, so a sheet that fails to save is
+        # reported on its own (see errors()) and re-read.
+        edited = [table for table, change in changes.items() if change.get('updated') or change.get('deleted')]
+        # New rows' IDs are checked against the loaded copy too
+        for table in changes:
+            self.load(table)
+        unread = []
+        
+        def queue(frames):
+            writes = []
+            for table, change in changes.items():
+                if self.key(table) in frames:
+                    writes.append((table, frames[self.key(table)], None))
+                elif table in edited:
+                    # The sheet couldn't be read, so there is nothing to merge into
+                    writes.append((table, change['df'], None))
+                    unread.append(table)
+                else:
+                    writes.append((table, None, change['appended']))
+            self.queue_writes(writes)
+        
+        _shared_commit(_shared_changes(self, changes), then=queue)
+        for table in unread:
+            _shared_put(self.key(table), changes[table]['df'])
+    
+    def pending(self):
+        return _write_queue().pending()
+    
+    def errors(self):
+        return _write_queue().errors()
+    
+    def refresh(self):
+        _write_queue().flush()
+        for table in TABLE_SHEETS:
+            invalidate_shared(*self.key(table))
+            # Re-read what the sheet holds before the next diffed save
+            _remember_synced(*self.key(table), pd.DataFrame())
+
+
+SQLITE_INDEXES = {'users': ['Username'], 'clients': ['Client_ID', 'Assigned_To'],
+                  'listings': ['Listing_ID', 'Assigned_To'], 'deals': ['Deal_ID', 'Client_ID', 'Partner_Name']}
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+@st.cache_resource
+def _sqlite_database(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    with conn:
+        for table, columns in TABLE_COLUMNS.items():
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(_quote(c) for c in columns)})")
+            for column in SQLITE_INDEXES[table]:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column.lower()} ON {table} ({_quote(column)})")
+    return {'conn': conn, 'lock': threading.Lock()}
+
+class SQLiteStorage:
+    def __init__(self, path, mirror=None):
+        self.path = path
+        self.mirror = mirror
+        self._db = _sqlite_database(path)
+    
+    def describe(self):
+        return f"local database ({self.path})" + (" mirrored to Google Sheets" if self.mirror else "")
+    
+    def key(self, table):
+        return (self.path, table)
+    
+    def _columns(self, conn, table, df):
+        # Columns added to the frame since the table was created are added to the table too,
+        # and so is Row_Version, which update and delete check even if the frame has none
+        existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        for column in dict.fromkeys([*df.columns, ROW_VERSION]):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {_quote(column)}")
+        return list(df.columns)
+    
+    def _insert(self, conn, table, df):
+        columns = self._columns(conn, table, df)
+        placeholders = ', '.join('?' for _ in columns)
+        conn.executemany(f"INSERT INTO {table} ({', '.join(_quote(c) for c in columns)}) VALUES ({placeholders})",
+                         _frame_rows(df)[1:])
+    
+    def load(self, table):
+        def fetch():
+            with self._db['lock']:
+                cursor = self._db['conn'].execute(f"SELECT * FROM {table} ORDER BY rowid")
+                rows = cursor.fetchall()
+            return apply_schema(table, pd.DataFrame(rows, columns=[d[0] for d in cursor.description])) if rows else pd.DataFrame()
+        return _load_shared(self.key(table), fetch)
+    
+    def save(self, table, df):
+        with self._db['lock'], self._db['conn'] as conn:
+            conn.execute(f"DELETE FROM {table}")
+            self._insert(conn, table, df)
+        _shared_put(self.key(table), df)
+        if self.mirror:
+            self.mirror.queue_save(table, df)
+    
+    def append(self, table, records):
+        self.commit({table: {'appended': records}})
+    
+    def update(self, table, df, keys):
+        self.commit({table: {'df': df, 'updated': keys}})
+    
+    def delete(self, table, df, keys):
+        self.commit({table: {'df': df, 'deleted': keys}})
+    
+    def _update_rows(self, conn, table, df, keys):
+        # Returns the keys of rows someone else changed first
+        key_column = TABLE_KEYS[table]
+        changed = df[df[key_column].isin(keys)]
+        version = _quote(ROW_VERSION)
+        columns = [c for c in self._columns(conn, table, df) if c != ROW_VERSION]
+        assignments = ', '.join(f"{_quote(c)} = ?" for c in columns)
+        update = (f"UPDATE {table} SET {assignments}, {version} = ? "
+                  f"WHERE {_quote(key_column)} = ? AND COALESCE({version}, 0) = ?")
+        versions = [_row_version(v) for v in changed[ROW_VERSION]] if ROW_VERSION in changed else [0] * len(changed)
+        conflicts = []
+        for row, read_at in zip(_frame_rows(changed[columns])[1:], versions):
+            key = row[columns.index(key_column)]
+            if conn.execute(update, row + [read_at + 1, key, read_at]).rowcount == 0:
+                conflicts.append(key)
+        return conflicts
+    
+    def _taken_keys(self, conn, table, records):
+        # New rows whose ID another session has already saved
+        key_column = TABLE_KEYS[table]
+        keys = [record.get(key_column) for record in records]
+        placeholders = ', '.join('?' for _ in keys)
+        return [row[0] for row in conn.execute(
+            f"SELECT {_quote(key_column)} FROM {table} WHERE {_quote(key_column)} IN ({placeholders})", keys)]
+    
+    def _delete_rows(self, conn, table, df, keys):
+        key_column, version = _quote(TABLE_KEYS[table]), _quote(ROW_VERSION)
+        self._columns(conn, table, df)
+        conflicts = []
+        for key, read_at in keys.items():
+            deleted = conn.execute(f"DELETE FROM {table} WHERE {key_column} = ? AND COALESCE({version}, 0) = ?",
+                                   (key, read_at)).rowcount
+            # A row someone else already deleted is no conflict
+            if not deleted and conn.execute(f"SELECT 1 FROM {table} WHERE {key_column} = ?", (key,)).fetchone():
+                conflicts.append(key)
+        return conflicts
+    
+    def commit(self, changes):
+        # One transaction for every table: a conflict on any row rolls all of them back
+        with self._db['lock'], self._db['conn'] as conn:
+            for table, change in changes.items():
+                conflicts = []
+                if change.get('appended'):
+                    conflicts += self._taken_keys(conn, table, change['appended'])
+                    self._insert(conn, table, pd.DataFrame(change['appended']))
+                if change.get('updated'):
+                    conflicts += self._update_rows(conn, table, change['df'], change['updated'])
+                if change.get('deleted'):
+                    conflicts += self._delete_rows(conn, table, change['df'], change['deleted'])
+                if conflicts:
+                    # Our copy is out of date too; the next read comes from the database
+                    invalidate_shared(*self.key(table))
+                    raise WriteConflict(table, conflicts)
+        # Our copies follow the database; the mirror gets the merged tables, in commit order
+        reload = []
+        
+        def mirror(frames):
+            writes = []
+            for table, change in changes.items():
+                if self.key(table) in frames:
+                    writes.append((table, frames[self.key(table)], None))
+                elif change.get('updated') or change.get('deleted'):
+                    reload.append(table)
+                elif change.get('appended'):
+                    writes.append((table, None, change['appended']))
+            self.mirror.queue_writes(writes)
+        
+        _shared_commit(_shared_changes(self, changes), check=False, then=mirror if self.mirror else None)
+        for table in reload:
+            self.mirror.queue_save(table, self.load(table))
+    
+    def pending(self):
+        return self.mirror.pending() if self.mirror else 0
+    
+    def errors(self):
+        return self.mirror.errors() if self.mirror else []
+    
+    def refresh(self):
+        for table in TABLE_COLUMNS:
+            invalidate_shared(*self.key(table))
+
+
+def _storage_settings():
+    try:
+        if 'storage' in st.secrets:
+            return dict(st.secrets['storage'])
+    except:
+        pass
+    try:
+        with open('sheets_config.json', 'r') as f:
+            return json.load(f).get('storage', {})
+    except:
+        return {}
+
+def init_storage():
+    settings = _storage_settings()
+    if settings.get('backend') == 'sqlite':
+        try:
+            mirror = None
+            if settings.get('mirror_to_sheets'):
+                client, config = init_google_sheets()
+                if client and config:
+                    mirror = SheetsStorage(client, config)
+            return SQLiteStorage(settings.get('path', 'lyns_crm.db'), mirror)
+        except Exception as e:
+            st.error(f"Local database error: {e}")
+            return None
+    
+    # No quiet switch to a local file when Sheets is down: other sessions wouldn't see it and
+    # hosted disks are wiped on restart. The session runs memory-only, with a warning.
+    client, config = init_google_sheets()
+    if client and config:
+        return SheetsStorage(client, config)
+    return None
+
 
 LOCATIONS = ["Sakinaka", "Chandivali", "Marol", "JB Nagar", "Chakala", "Kurla", "Powai", 
              "Andheri-Kurla Road", "Andheri East", "Andheri West", "Ghatkopar", "Vikhroli", 
@@ -118,131 +1225,854 @@ LOCATIONS = ["Sakinaka", "Chandivali", "Marol", "JB Nagar", "Chakala", "Kurla",
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def initialize_data():
-    # Initialize Google Sheets connection
-    if 'gs_client' not in st.session_state:
-        client, config = init_google_sheets()
-        st.session_state.gs_client = client
-        st.session_state.gs_config = config
-    
-    client = st.session_state.gs_client
-    config = st.session_state.gs_config
-    
-    if client and config:
-        # Load Users from Google Sheets
-        if 'users' not in st.session_state:
-            users_df = load_from_sheets(client, config['users_sheet_id'])
-            if users_df.empty:
-                # Create default admin if sheet is empty
-                st.session_state.users = pd.DataFrame([{
-                    'Username': 'admin',
-                    'Password': hash_password('lyns2024'),
-                    'Role': 'Admin',
-                    'Full_Name': 'Lyndon',
-                    'Email': 'lyndon@lynsrealestate.com',
-                    'Status': 'Active'
-                }])
-                save_to_sheets(client, config['users_sheet_id'], st.session_state.users)
-            else:
-                st.session_state.users = users_df
-        
-        # Load Clients
-        if 'clients' not in st.session_state:
-            clients_df = load_from_sheets(client, config['clients_sheet_id'])
-            if clients_df.empty:
-                st.session_state.clients = pd.DataFrame(columns=[
-                    'Client_ID', 'Client_Name', 'Contact_Number', 'Email', 'Client_Type', 'Property_Category', 
-                    'Property_Type', 'Furnishing_Status', 'Budget_Min', 'Budget_Max', 'Budget_Currency', 
-                    'Location_Preference', 'BHK_Requirement', 'Requirements_Notes', 'Possession_Date', 
-                    'Status', 'Assigned_To', 'Date_Registered', 'Source', 'Priority'
-                ])
+# New rows are buffered and folded into the session tables with a single concat,
+# instead of copying the whole table on every insert
+def buffer_insert(table, record):
+    st.session_state.insert_buffer.setdefault(table, []).append(record)
+
+def _id_number(value):
+    try:
+        return int(str(value)[1:])
+    except ValueError:
+        return 0
+
+# Each session table keeps a primary key -> row label map, so reading or editing one
+# record is a dict lookup instead of a scan over the whole table
+def _row_index(table):
+    df = st.session_state[table]
+    index = st.session_state.row_index.get(table)
+    if index is None or index['frame'] is not df:
+        if not df.index.is_unique or not pd.api.types.is_integer_dtype(df.index):
+            df = st.session_state[table] = df.reset_index(drop=True)
+        if index is None or not _replay(table, index, df):
+            key = TABLE_KEYS[table]
+            keys = df[key].tolist() if key in df else []
+            buffered = [record[key] for record in st.session_state.insert_buffer.get(table, [])]
+            index = {
+                'frame': df,
+                'labels': dict(zip(keys, df.index.tolist())),
+                'next_label': int(df.index.max()) + 1 if len(df) else 0,
+                'last_id': max([_id_number(k) for k in keys + buffered], default=0),
+            }
+            st.session_state.row_index[table] = index
+        index['version'] = st.session_state.data_versions.get(table)
+        index['touched'] = set()
+    return index
+
+def _replay(table, index, df):
+    # After a reload, moves the index and everything built on it (owners, search, matching,
+    # totals, rollups) over to the new frame by taking out and putting back only the rows
+    # saved since, as logged by the shared table, plus the ones this session edited itself.
+    # False when that can't be done and the index has to be rebuilt.
+    storage = st.session_state.storage
+    changed = shared_changes_since(storage.key(table), index.get('version')) if storage else None
+    key = TABLE_KEYS[table]
+    old = index['frame']
+    if changed is None or key not in df or key not in old:
+        return False
+    changed |= index.get('touched', set())
+    old_labels = {k: index['labels'][k] for k in changed if k in index['labels']}
+    moved = df[key].isin(list(changed))
+    # Every other row must be the same row under the same label
+    if not old[key].drop(list(old_labels.values())).equals(df[key][~moved]):
+        return False
+    owner = OWNER_COLUMNS.get(table)
+    new_labels = dict(zip(df[key][moved].tolist(), df.index[moved].tolist()))
+    search = [c for c in SEARCH_COLUMNS.get(table, []) if c in df]
+    
+    def text_of(frame, label):
+        return [frame.at[label, c] if c in frame else '' for c in search]
+    
+    # Rows whose searchable text is unchanged keep their postings, so the sorted terms stay valid
+    retext = {k for k in old_labels if k not in new_labels or old_labels[k] != new_labels[k]
+              or text_of(old, old_labels[k]) != text_of(df, new_labels[k])} | (new_labels.keys() - old_labels.keys())
+    for k, label in old_labels.items():
+        del index['labels'][k]
+        if owner in old:
+            _move_owner(index, label, old=old.at[label, owner])
+        if k in retext:
+            _remove_text(index, label)
+        if 'match' in index:
+            index['match'].remove(table, label)
+        if 'totals' in index or 'rollups' in index:
+            _aggregate(index, table, [old.loc[label].to_dict()], -1)
+    for k, label in new_labels.items():
+        row = df.loc[label]
+        index['labels'][k] = label
+        if owner in df:
+            _move_owner(index, label, new=row[owner])
+        if k in retext:
+            _add_text(index, label, text_of(df, label))
+        if 'match' in index:
+            index['match'].put(table, label, row)
+        if 'totals' in index or 'rollups' in index:
+            _aggregate(index, table, [row.to_dict()], 1)
+        index['last_id'] = max(index['last_id'], _id_number(k))
+    index['frame'] = df
+    index['next_label'] = max(index['next_label'], int(df.index.max()) + 1 if len(df) else 0)
+    return True
+
+def next_id(table, prefix):
+    # Numbered past the highest existing ID, so IDs of deleted rows are never handed out again
+    index = _row_index(table)
+    index['last_id'] += 1
+    return f"{prefix}{index['last_id']:04d}"
+
+def flush_inserts(table=None):
+    tables = [table] if table else list(st.session_state.insert_buffer)
+    for name in tables:
+        records = st.session_state.insert_buffer.pop(name, None)
+        if records:
+            index = _row_index(name)
+            start = index['next_label']
+            new_rows = _conform(name, index['frame'], pd.DataFrame(records, index=range(start, start + len(records))))
+            key = TABLE_KEYS[name]
+            index['labels'].update((record[key], start + i) for i, record in enumerate(records))
+            index['touched'].update(record[key] for record in records)
+            if name in OWNER_COLUMNS:
+                for i, record in enumerate(records):
+                    _move_owner(index, start + i, new=record.get(OWNER_COLUMNS[name], ''))
+            if name in SEARCH_COLUMNS:
+                for i, record in enumerate(records):
+                    _add_text(index, start + i, [record.get(c, '') for c in SEARCH_COLUMNS[name]])
+            if 'match' in index:
+                index['match'].put_many(name, new_rows)
+            if name in TABLE_AGGREGATES:
+                _aggregate(index, name, records, 1)
+            index['next_label'] = start + len(records)
+            index['frame'] = st.session_state[name] = pd.concat([index['frame'], new_rows])
+
+def get_record(table, key):
+    flush_inserts(table)
+    label = _row_index(table)['labels'].get(key)
+    return None if label is None else st.session_state[table].loc[label]
+
+def patch_record(table, key, values):
+    flush_inserts(table)
+    label = _row_index(table)['labels'].get(key)
+    if label is None:
+        return False
+    df = st.session_state[table]
+    index = _row_index(table)
+    index['touched'].add(key)
+    old_row = df.loc[label].to_dict() if 'totals' in index or 'rollups' in index else None
+    owner_column = OWNER_COLUMNS.get(table)
+    if owner_column in values:
+        _move_owner(index, label, df.at[label, owner_column], values[owner_column])
+    for column, value in values.items():
+        _set_cell(df, label, column, value)
+    if any(column in SEARCH_COLUMNS.get(table, []) for column in values):
+        _remove_text(index, label)
+        _add_text(index, label, [df.at[label, c] if c in df else '' for c in SEARCH_COLUMNS[table]])
+    if 'match' in index:
+        index['match'].put(table, label, df.loc[label])
+    if old_row is not None:
+        _aggregate(index, table, [old_row], -1)
+        _aggregate(index, table, [df.loc[label].to_dict()], 1)
+    return True
+
+def delete_record(table, key):
+    flush_inserts(table)
+    index = _row_index(table)
+    label = index['labels'].pop(key, None)
+    if label is None:
+        return False
+    index['touched'].add(key)
+    if table in OWNER_COLUMNS:
+        _move_owner(index, label, old=index['frame'].at[label, OWNER_COLUMNS[table]])
+    _remove_text(index, label)
+    if 'match' in index:
+        index['match'].remove(table, label)
+    if 'totals' in index or 'rollups' in index:
+        _aggregate(index, table, [index['frame'].loc[label].to_dict()], -1)
+    if ROW_VERSION in index['frame']:
+        # persist_deleted saves the delete only if nobody has changed the row since
+        index.setdefault('deleted_versions', {})[key] = _row_version(index['frame'].at[label, ROW_VERSION])
+    index['frame'] = st.session_state[table] = index['frame'].drop(label)
+    return True
+
+# Rows owned by each partner, by the exact name stored in the owner column
+OWNER_COLUMNS = {'clients': 'Assigned_To', 'listings': 'Assigned_To', 'deals': 'Partner_Name'}
+
+def _owner_key(value):
+    return str(value).strip().casefold()
+
+def _owner_index(table):
+    index = _row_index(table)
+    if 'owners' not in index:
+        owners = {}
+        df = index['frame']
+        if OWNER_COLUMNS[table] in df:
+            for label, owner in zip(df.index.tolist(), df[OWNER_COLUMNS[table]].tolist()):
+                owners.setdefault(_owner_key(owner), set()).add(label)
+        index['owners'] = owners
+    return index['owners']
+
+def _move_owner(index, label, old=None, new=None):
+    owners = index.get('owners')
+    if owners is None:
+        return
+    if old is not None:
+        owners.get(_owner_key(old), set()).discard(label)
+    if new is not None:
+        owners.setdefault(_owner_key(new), set()).add(label)
+
+def owned_rows(table, owner):
+    flush_inserts(table)
+    labels = _owner_index(table).get(_owner_key(owner))
+    df = st.session_state[table]
+    return df.loc[sorted(labels)] if labels else df.iloc[0:0]
+
+# Inverted index over the free-text columns, for the search boxes
+SEARCH_COLUMNS = {
+    'clients': ['Client_ID', 'Client_Name', 'Contact_Number', 'Email', 'Location_Preference', 'Requirements_Notes'],
+    'listings': ['Listing_ID', 'Property_Address', 'Location', 'Amenities', 'Broker_Name', 'Notes'],
+}
+
+def _tokens(text):
+    return re.findall(r'\w+', str(text).casefold())
+
+def _text_index(table):
+    index = _row_index(table)
+    if 'text' not in index:
+        index['text'] = {'postings': {}, 'docs': {}, 'terms': None}
+        df = index['frame']
+        columns = [c for c in SEARCH_COLUMNS[table] if c in df]
+        for label, row in zip(df.index.tolist(), df[columns].itertuples(index=False, name=None)):
+            _add_text(index, label, row)
+    return index['text']
+
+def _add_text(index, label, values):
+    text = index.get('text')
+    if text is None:
+        return
+    counts = Counter(_tokens(' '.join(str(value) for value in values if value == value)))
+    text['docs'][label] = counts
+    for token, count in counts.items():
+        if token not in text['postings']:
+            text['postings'][token] = {}
+            text['terms'] = None
+        text['postings'][token][label] = count
+
+def _remove_text(index, label):
+    text = index.get('text')
+    if text is None:
+        return
+    for token in text['docs'].pop(label, {}):
+        postings = text['postings'][token]
+        postings.pop(label, None)
+        if not postings:
+            del text['postings'][token]
+            text['terms'] = None
+
+def search_records(table, query, limit=200):
+    flush_inserts(table)
+    text = _text_index(table)
+    if text['terms'] is None:
+        text['terms'] = sorted(text['postings'])
+    terms, docs = text['terms'], len(text['docs']) or 1
+    scores = None
+    for token in set(_tokens(query)):
+        # Every query word must match the start of some word in the record
+        token_scores = {}
+        start = bisect.bisect_left(terms, token)
+        for term in itertools.takewhile(lambda t: t.startswith(token), terms[start:]):
+            postings = text['postings'][term]
+            weight = math.log(1 + docs / len(postings)) * (1.0 if term == token else 0.5)
+            for label, count in postings.items():
+                token_scores[label] = token_scores.get(label, 0) + weight * count
+        if scores is None:
+            scores = token_scores
+        else:
+            scores = {label: score + token_scores[label] for label, score in scores.items() if label in token_scores}
+        if not scores:
+            break
+    df = st.session_state[table]
+    if not scores:
+        return df.iloc[0:0]
+    ranked = sorted(scores, key=lambda label: (-scores[label], label))[:limit]
+    return df.loc[ranked]
+
+# Client <-> listing matching. Per-row features are kept in NumPy arrays alongside the
+# tables, so scoring is vectorized and a new or edited row only re-encodes itself.
+CURRENCY_FACTORS = {'₹ Rupees': 1, '₹ Lakhs': 1e5, '₹ Crores': 1e7}
+MATCH_WEIGHTS = {'budget': 0.4, 'location': 0.3, 'bhk': 0.15, 'type': 0.15}
+BUDGET_TOLERANCE = 0.25  # a price this far outside the budget (as a share of Budget_Max) scores 0
+UNAVAILABLE_STATUSES = ['Sold', 'Not Available']
+
+class _MatchEngine:
+    def __init__(self, clients, listings):
+        self._vocab = {}
+        self._places = {}
+        self._sides = {}
+        for table, df in [('clients', clients), ('listings', listings)]:
+            self._sides[table] = {'labels': np.empty(0, dtype=np.int64), 'alive': np.empty(0, dtype=bool),
+                                  'pos': {}, 'features': None}
+            self.put_many(table, df)
+    
+    def _codes(self, series, vocab):
+        keys = series.astype(object).fillna('').astype(str).str.strip().str.casefold()
+        for key in keys.unique():
+            vocab.setdefault(key, len(vocab))
+        return keys.map(vocab).to_numpy(dtype=np.int64)
+    
+    def _features(self, table, df):
+        def column(name):
+            return df[name] if name in df else pd.Series('', index=df.index)
+        
+        def money(amount, currency):
+            factors = column(currency).astype(object).map(CURRENCY_FACTORS).fillna(1).to_numpy(dtype=float)
+            return pd.to_numeric(column(amount), errors='coerce').to_numpy(dtype=float) * factors
+        
+        features = {'category': self._codes(column('Property_Category'), self._vocab),
+                    'type': self._codes(column('Property_Type'), self._vocab)}
+        if table == 'clients':
+            features['bhk'] = self._codes(column('BHK_Requirement'), self._vocab)
+            low, high = money('Budget_Min', 'Budget_Currency'), money('Budget_Max', 'Budget_Currency')
+            features['min'] = np.nan_to_num(low, nan=0).astype(np.float32)
+            features['max'] = np.nan_to_num(high, nan=np.inf).astype(np.float32)
+            # 1 / the allowed overshoot; 0 (no budget score) when the budget is missing
+            with np.errstate(divide='ignore'):
+                features['tolerance'] = np.where(high > 0, 1 / (BUDGET_TOLERANCE * high), 0).astype(np.float32)
+            places = column('Location_Preference').astype(object).fillna('').astype(str).str.split(',').reset_index(drop=True).explode()
+            places = places[places.str.strip() != '']
+            codes = self._codes(places, self._places)
+            features['places'] = np.zeros((len(df), len(self._places)), dtype=bool)
+            features['places'][places.index.to_numpy(dtype=np.int64), codes] = True
+        else:
+            features['bhk'] = self._codes(column('BHK'), self._vocab)
+            # A missing price is treated as far outside every budget
+            features['price'] = np.nan_to_num(money('Price', 'Price_Currency'), nan=1e30).astype(np.float32)
+            features['place'] = self._codes(column('Location'), self._places)
+            features['available'] = ~column('Listing_Status').isin(UNAVAILABLE_STATUSES).to_numpy()
+        return features
+    
+    def _widen(self, matrix):
+        if matrix.shape[1] < len(self._places):
+            matrix = np.hstack([matrix, np.zeros((len(matrix), len(self._places) - matrix.shape[1]), dtype=bool)])
+        return matrix
+    
+    def put_many(self, table, df):
+        # Appends rows that are new to the engine; edits go through put
+        side = self._sides[table]
+        features = self._features(table, df)
+        if side['features'] is None:
+            # Copied so they are writable; pandas may hand back read-only views
+            side['features'] = {key: values.copy() for key, values in features.items()}
+        else:
+            for key, values in features.items():
+                if values.ndim == 2:
+                    side['features'][key] = np.vstack([self._widen(side['features'][key]), self._widen(values)])
+                else:
+                    side['features'][key] = np.concatenate([side['features'][key], values])
+        start = len(side['labels'])
+        side['labels'] = np.concatenate([side['labels'], df.index.to_numpy(dtype=np.int64)])
+        side['alive'] = np.concatenate([side['alive'], np.ones(len(df), dtype=bool)])
+        side['pos'].update(zip(df.index.tolist(), range(start, start + len(df))))
+    
+    def put(self, table, label, row):
+        side = self._sides[table]
+        df = pd.DataFrame([row], index=[label])
+        if label not in side['pos']:
+            self.put_many(table, df)
+            return
+        position = side['pos'][label]
+        for key, values in self._features(table, df).items():
+            if values.ndim == 2:
+                side['features'][key] = self._widen(side['features'][key])
+                side['features'][key][position] = self._widen(values)[0]
             else:
-                st.session_state.clients = clients_df
-        
-        # Load Listings
-        if 'listings' not in st.session_state:
-            listings_df = load_from_sheets(client, config['listings_sheet_id'])
-            if listings_df.empty:
-                st.session_state.listings = pd.DataFrame(columns=[
-                    'Listing_ID', 'Property_Address', 'Location', 'Property_Category', 'Property_Type', 
-                    'Furnishing_Status', 'BHK', 'Price', 'Price_Currency', 'Area_SqFt', 'Broker_Name', 
-                    'Broker_Contact', 'Amenities', 'Listing_Status', 'Date_Added', 'Visible_To_Partner', 
-                    'Notes', 'Assigned_To', 'Shown_To_Clients'
-                ])
+                side['features'][key][position] = values[0]
+    
+    def remove(self, table, label):
+        side = self._sides[table]
+        position = side['pos'].pop(label, None)
+        if position is not None:
+            side['alive'][position] = False
+    
+    def _score(self, clients, listings):
+        c, l = self._sides['clients']['features'], self._sides['listings']['features']
+        c['places'] = self._widen(c['places'])
+        price = l['price'][listings][None, :]
+        gap = np.maximum(c['min'][clients][:, None] - price, 0)
+        gap += np.maximum(price - c['max'][clients][:, None], 0)
+        gap *= c['tolerance'][clients][:, None]
+        score = np.clip(1 - gap, 0, 1, out=gap)
+        score *= np.float32(MATCH_WEIGHTS['budget'])
+        score += c['places'][clients][:, l['place'][listings]] * np.float32(MATCH_WEIGHTS['location'])
+        score += (c['bhk'][clients][:, None] == l['bhk'][listings][None, :]) * np.float32(MATCH_WEIGHTS['bhk'])
+        score += (c['type'][clients][:, None] == l['type'][listings][None, :]) * np.float32(MATCH_WEIGHTS['type'])
+        # Residential clients are never matched with commercial listings, or with sold ones
+        score *= (c['category'][clients][:, None] == l['category'][listings][None, :]) & l['available'][listings][None, :]
+        return score
+    
+    def _live(self, table):
+        side = self._sides[table]
+        if table == 'listings':
+            return np.flatnonzero(side['alive'] & side['features']['available'])
+        return np.flatnonzero(side['alive'])
+    
+    def _top(self, scores, labels, top_n):
+        order = np.argsort(-scores, kind='stable')[:top_n]
+        return [(int(labels[i]), float(scores[i])) for i in order if scores[i] > 0]
+    
+    def matches_for(self, table, label, top_n=10):
+        other = 'listings' if table == 'clients' else 'clients'
+        position = self._sides[table]['pos'].get(label)
+        candidates = self._live(other)
+        if position is None or not len(candidates):
+            return []
+        if table == 'clients':
+            scores = self._score(np.array([position]), candidates)[0]
+        else:
+            scores = self._score(candidates, np.array([position]))[:, 0]
+        return self._top(scores, self._sides[other]['labels'][candidates], top_n)
+    
+    def best_matches(self, top_n=3, chunk=1000):
+        # Scores every live client against every live listing, a block of clients at a time
+        clients, listings = self._live('clients'), self._live('listings')
+        listing_labels = self._sides['listings']['labels'][listings]
+        results = []
+        if not len(listings):
+            return results
+        client_labels = self._sides['clients']['labels']
+        top_n = min(top_n, len(listings))
+        for start in range(0, len(clients), chunk):
+            block = clients[start:start + chunk]
+            scores = self._score(block, listings)
+            top = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+            rows, cols = np.nonzero(top_scores > 0)
+            results.extend(zip(client_labels[block[rows]].tolist(), listing_labels[top[rows, cols]].tolist(),
+                               top_scores[rows, cols].tolist()))
+        return results
+
+def _match_engine():
+    clients, listings = _row_index('clients'), _row_index('listings')
+    engine = clients.get('match')
+    if engine is None or listings.get('match') is not engine:
+        engine = _MatchEngine(clients['frame'], listings['frame'])
+        clients['match'] = listings['match'] = engine
+    return engine
+
+def _match_table(table, hits):
+    df = st.session_state[table].loc[[label for label, _ in hits]].copy()
+    df.insert(0, 'Match_Score', [round(score * 100) for _, score in hits])
+    return df
+
+def listing_matches(client_id, top_n=10):
+    flush_inserts('clients')
+    flush_inserts('listings')
+    label = _row_index('clients')['labels'].get(client_id)
+    return _match_table('listings', _match_engine().matches_for('clients', label, top_n))
+
+def client_matches(listing_id, top_n=10):
+    flush_inserts('clients')
+    flush_inserts('listings')
+    label = _row_index('listings')['labels'].get(listing_id)
+    return _match_table('clients', _match_engine().matches_for('listings', label, top_n))
+
+def best_matches(top_n=1):
+    flush_inserts('clients')
+    flush_inserts('listings')
+    hits = _match_engine().best_matches(top_n)
+    clients, listings = st.session_state.clients, st.session_state.listings
+    return pd.DataFrame({
+        'Match_Score': [round(score * 100) for _, _, score in hits],
+        'Client_ID': clients.loc[[c for c, _, _ in hits], 'Client_ID'].tolist(),
+        'Client_Name': clients.loc[[c for c, _, _ in hits], 'Client_Name'].tolist(),
+        'Listing_ID': listings.loc[[l for _, l, _ in hits], 'Listing_ID'].tolist(),
+        'Property_Address': listings.loc[[l for _, l, _ in hits], 'Property_Address'].tolist(),
+    })
+
+CLIENT_COLUMNS = [
+    'Client_ID', 'Client_Name', 'Contact_Number', 'Email', 'Client_Type', 'Property_Category', 
+    'Property_Type', 'Furnishing_Status', 'Budget_Min', 'Budget_Max', 'Budget_Currency', 
+    'Location_Preference', 'BHK_Requirement', 'Requirements_Notes', 'Possession_Date', 
+    'Status', 'Assigned_To', 'Date_Registered', 'Source', 'Priority'
+]
+
+LISTING_COLUMNS = [
+    'Listing_ID', 'Property_Address', 'Location', 'Property_Category', 'Property_Type', 
+    'Furnishing_Status', 'BHK', 'Price', 'Price_Currency', 'Area_SqFt', 'Broker_Name', 
+    'Broker_Contact', 'Amenities', 'Listing_Status', 'Date_Added', 'Visible_To_Partner', 
+    'Notes', 'Assigned_To', 'Shown_To_Clients'
+]
+
+DEAL_COLUMNS = [
+    'Deal_ID', 'Client_ID', 'Listing_ID', 'Brokerage_From_Owner', 'Brokerage_From_Client', 
+    'Total_Brokerage', 'Number_Of_Brokers', 'Your_Share', 'Partner_Share', 'Partner_Name', 
+    'Deal_Date', 'Payment_Status', 'Notes'
+]
+
+USER_COLUMNS = ['Username', 'Password', 'Role', 'Full_Name', 'Email', 'Status']
+
+TABLE_COLUMNS = {'users': USER_COLUMNS, 'clients': CLIENT_COLUMNS, 'listings': LISTING_COLUMNS, 'deals': DEAL_COLUMNS}
+
+TABLE_KEYS = {'users': 'Username', 'clients': 'Client_ID', 'listings': 'Listing_ID', 'deals': 'Deal_ID'}
+
+# Bumped on every saved edit, so a save from a stale copy of a row is caught instead of
+# overwriting someone else's change. Rows saved before versioning count as version 0.
+ROW_VERSION = 'Row_Version'
+
+# Column dtypes applied to every table as it is loaded. Sheets are read as text, so every
+# column is listed; low-cardinality text is stored as categoricals, and IDs, phone numbers
+# and free text stay strings (a phone number never turns into an int and loses its 0).
+TABLE_SCHEMAS = {
+    'users': {'Username': 'str', 'Password': 'str', 'Role': 'category', 'Full_Name': 'str', 'Email': 'str',
+              'Status': 'category', ROW_VERSION: 'Int64'},
+    'clients': {
+        'Client_ID': 'str', 'Client_Name': 'str', 'Contact_Number': 'str', 'Email': 'str',
+        'Location_Preference': 'str', 'Requirements_Notes': 'str', 'Possession_Date': 'str',
+        'Client_Type': 'category', 'Property_Category': 'category', 'Property_Type': 'category',
+        'Furnishing_Status': 'category', 'Budget_Min': 'float64', 'Budget_Max': 'float64',
+        'Budget_Currency': 'category', 'BHK_Requirement': 'category', 'Status': 'category',
+        'Assigned_To': 'category', 'Date_Registered': 'datetime64[ns]', 'Source': 'category',
+        'Priority': 'category', ROW_VERSION: 'Int64',
+    },
+    'listings': {
+        'Listing_ID': 'str', 'Property_Address': 'str', 'Broker_Name': 'str', 'Broker_Contact': 'str',
+        'Amenities': 'str', 'Notes': 'str', 'Shown_To_Clients': 'str',
+        'Location': 'category', 'Property_Category': 'category', 'Property_Type': 'category',
+        'Furnishing_Status': 'category', 'BHK': 'category', 'Price': 'float64', 'Price_Currency': 'category',
+        'Area_SqFt': 'Int64', 'Listing_Status': 'category', 'Date_Added': 'datetime64[ns]',
+        'Visible_To_Partner': 'category', 'Assigned_To': 'category', ROW_VERSION: 'Int64',
+    },
+    'deals': {
+        'Deal_ID': 'str', 'Client_ID': 'str', 'Listing_ID': 'str', 'Notes': 'str',
+        'Brokerage_From_Owner': 'float64', 'Brokerage_From_Client': 'float64', 'Total_Brokerage': 'float64',
+        'Number_Of_Brokers': 'Int64', 'Your_Share': 'float64', 'Partner_Share': 'float64',
+        'Partner_Name': 'category', 'Deal_Date': 'datetime64[ns]', 'Payment_Status': 'category',
+        ROW_VERSION: 'Int64',
+    },
+}
+
+def _typed(values, dtype):
+    # Returns None when the column can't be converted without losing values, so a stray
+    # entry typed into the sheet by hand never gets blanked on the next save
+    blank = values.isna() | (values.astype(str).str.strip() == '')
+    if dtype == 'str':
+        # Whole numbers saved by older versions come back without a trailing .0
+        return values.map(lambda v: str(int(v)) if isinstance(v, float) and v.is_integer() else v
+                          if isinstance(v, str) or pd.isna(v) else str(v)).astype('str')
+    if dtype == 'category':
+        try:
+            return values.astype('category')
+        except TypeError:
+            return None
+    if dtype.startswith('datetime'):
+        converted = pd.to_datetime(values.where(~blank), errors='coerce', format='ISO8601')
+    else:
+        converted = pd.to_numeric(values.where(~blank), errors='coerce')
+    if (converted.isna() & ~blank).any():
+        return None
+    if dtype == 'Int64':
+        if (converted.dropna() % 1 != 0).any():
+            return None
+        return converted.astype('Int64')
+    return converted.astype(dtype)
+
+def apply_schema(table, df):
+    columns = {}
+    for column, dtype in TABLE_SCHEMAS.get(table, {}).items():
+        if column in df and str(df[column].dtype) != dtype:
+            converted = _typed(df[column], dtype)
+            if converted is not None:
+                columns[column] = converted
+    if table in TABLE_SCHEMAS and len(df.columns) and ROW_VERSION not in df:
+        columns[ROW_VERSION] = pd.Series(0, index=df.index, dtype='Int64')
+    return df.assign(**columns) if columns else df
+
+def _conform(table, frame, new_rows):
+    # New rows take the table's dtypes so concat keeps categoricals and dates typed
+    columns = {}
+    for column in frame.columns.intersection(new_rows.columns):
+        dtype = frame[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            values = new_rows[column].tolist()
+            missing = [v for v in dict.fromkeys(values) if v == v and v not in dtype.categories]
+            if missing:
+                frame[column] = frame[column].cat.add_categories(missing)
+                dtype = frame[column].dtype
+            columns[column] = pd.Categorical.from_codes(dtype.categories.get_indexer(values), dtype=dtype)
+    return apply_schema(table, new_rows.assign(**columns))
+
+def _set_cell(df, label, column, value):
+    try:
+        df.at[label, column] = value
+        return
+    except (TypeError, ValueError):
+        pass
+    if isinstance(df[column].dtype, pd.CategoricalDtype) and not pd.isna(value):
+        df[column] = df[column].cat.add_categories([value])
+    elif pd.api.types.is_numeric_dtype(df[column].dtype) and str(value).strip() == '':
+        value = None
+    else:
+        # The value doesn't fit the column's dtype (e.g. a float budget in an int column)
+        df[column] = df[column].astype(object)
+    df.at[label, column] = value
+
+def _default_users(admin_email):
+    return pd.DataFrame([{
+        'Username': 'admin',
+        'Password': hash_password('lyns2024'),
+        'Role': 'Admin',
+        'Full_Name': 'Lyndon',
+        'Email': admin_email,
+        'Status': 'Active'
+    }])
+
+TABLE_SHEETS = {'users': 'users_sheet_id', 'clients': 'clients_sheet_id',
+                'listings': 'listings_sheet_id', 'deals': 'deals_sheet_id'}
+
+def _needs_load(table):
+    if table not in st.session_state:
+        return True
+    if not st.session_state.storage:
+        return False
+    # Another session has written to this table since we loaded it
+    return st.session_state.data_versions.get(table) != shared_version(*st.session_state.storage.key(table))
+
+def _start_load(table):
+    # Read the version first so a write landing mid-load triggers another reload
+    st.session_state.data_versions[table] = shared_version(*st.session_state.storage.key(table))
+    st.session_state.insert_buffer.pop(table, None)
+
+def _note_own_write(table, seen):
+    # Our own write needs no reload, unless another session also wrote in between
+    if seen is not None and shared_version(*st.session_state.storage.key(table)) == seen + 1:
+        st.session_state.data_versions[table] = seen + 1
+
+def persist_new_rows(table, records):
+    return _persist(table, {'appended': list(records)})
+
+def _write_conflict(table, error):
+    # The edit is dropped; reloading the table shows the version that was saved
+    st.session_state.setdefault('write_conflicts', []).append(str(error))
+    st.session_state.data_versions[table] = None
+
+def persist_rows(table, keys):
+    # False when someone else saved one of these rows first (see show_write_conflicts)
+    return _persist(table, {'updated': list(keys)})
+
+def persist_deleted(table, keys):
+    read_at = _row_index(table).get('deleted_versions', {})
+    return _persist(table, {'deleted': {key: read_at.pop(key, 0) for key in keys}})
+
+def _persist(table, change):
+    work = st.session_state.get('unit_of_work')
+    if work is None:
+        return _commit_changes({table: change})
+    # Held until the unit of work ends
+    pending = work['changes'].setdefault(table, {'appended': [], 'updated': [], 'deleted': {}})
+    pending['appended'] += change.get('appended', [])
+    pending['updated'] += [key for key in change.get('updated', []) if key not in pending['updated']]
+    pending['deleted'].update(change.get('deleted', {}))
+    return True
+
+def _commit_changes(changes):
+    storage = st.session_state.storage
+    changes = {table: change for table, change in changes.items() if any(change.values())}
+    for table, change in changes.items():
+        if change.get('updated') or change.get('deleted'):
+            # Rows added earlier in the same unit of work go in the saved frame too
+            flush_inserts(table)
+            change['df'] = st.session_state[table]
+    seen = {table: st.session_state.data_versions.get(table) for table in changes}
+    try:
+        if storage:
+            storage.commit(changes)
+    except WriteConflict as e:
+        _write_conflict(e.table, e)
+        # Nothing was saved, so the other tables' edits are dropped too
+        for table in changes:
+            st.session_state.data_versions[table] = None
+        return False
+    except Exception as e:
+        # A locked database or a failed request: nothing was saved, reload the tables
+        st.error(f"Error saving to {storage.describe()}: {e}")
+        for table in changes:
+            st.session_state.data_versions[table] = None
+        return False
+    for table, change in changes.items():
+        df, labels = st.session_state[table], _row_index(table)['labels']
+        for key in change.get('updated', []):
+            if key in labels:
+                read_at = _row_version(df.at[labels[key], ROW_VERSION]) if ROW_VERSION in df else 0
+                _set_cell(df, labels[key], ROW_VERSION, read_at + 1)
+        if storage:
+            _note_own_write(table, seen[table])
+    return True
+
+@contextmanager
+def unit_of_work():
+    # Saves made inside are collected across tables and committed together when the block
+    # ends: all of them or, if another user changed one of the rows first, none. The yielded
+    # dict's 'saved' says which. Nested blocks join the outer one.
+    if 'unit_of_work' in st.session_state:
+        yield st.session_state.unit_of_work
+        return
+    work = st.session_state.unit_of_work = {'changes': {}, 'after': [], 'saved': None}
+    try:
+        yield work
+    except BaseException:
+        # The session's tables already hold the edits; reload them from storage
+        for table in work['changes']:
+            st.session_state.data_versions[table] = None
+        raise
+    finally:
+        del st.session_state.unit_of_work
+    work['saved'] = _commit_changes(work['changes'])
+    if work['saved']:
+        for callback in work['after']:
+            callback()
+
+def saved_version(table, key):
+    # Notifications are keyed by the Row_Version their change was saved at, so each change is
+    # announced once however often the send is repeated, and a later change gets its own
+    record = get_record(table, key)
+    return 0 if record is None or ROW_VERSION not in record else _row_version(record[ROW_VERSION])
+
+def after_commit(callback):
+    # Runs callback once the current unit of work is saved, or now if there is none
+    work = st.session_state.get('unit_of_work')
+    if work is None:
+        callback()
+    else:
+        work['after'].append(callback)
+
+def refresh_data():
+    # Drop the shared copies so every session re-reads storage
+    if st.session_state.storage:
+        st.session_state.storage.refresh()
+
+def show_write_conflicts():
+    for message in st.session_state.pop('write_conflicts', []):
+        st.warning(f"⚠️ Your change was not saved: {message}. The latest data has been loaded; please make the change again.")
+
+def show_sync_status():
+    storage = st.session_state.storage
+    if not storage:
+        st.sidebar.error("⚠️ Memory-only mode: changes are not being saved")
+    else:
+        pending = storage.pending()
+        if pending:
+            st.sidebar.caption(f"⏳ {pending} change(s) waiting to sync")
+        else:
+            st.sidebar.caption(f"✅ All changes saved to {storage.describe()}")
+        for error in storage.errors():
+            st.sidebar.error(f"Sync failed: {error}")
+        queued = sum(_sheets_scheduler().depth().values())
+        if queued:
+            st.sidebar.caption(f"🚦 {queued} Google Sheets request(s) waiting for quota")
+    if _email_settings() is not None:
+        outbox = _notification_outbox()
+        counts = outbox.counts()
+        if counts.get('pending', 0) + counts.get('sending', 0):
+            st.sidebar.caption(f"📧 {counts.get('pending', 0) + counts.get('sending', 0)} notification(s) waiting to send")
+        if counts.get('failed'):
+            st.sidebar.warning(f"{counts['failed']} notification(s) could not be sent: {outbox.last_failure()}")
+            if st.sidebar.button("Retry notifications"):
+                outbox.retry_failed()
+
+def initialize_data(tables=None):
+    if 'insert_buffer' not in st.session_state:
+        st.session_state.insert_buffer = {}
+    if 'data_versions' not in st.session_state:
+        st.session_state.data_versions = {}
+    if 'row_index' not in st.session_state:
+        st.session_state.row_index = {}
+    
+    # Initialize storage (Google Sheets, or the local database)
+    if 'storage' not in st.session_state:
+        st.session_state.storage = init_storage()
+    
+    storage = st.session_state.storage
+    
+    if storage:
+        # Fetch every table this session needs at once rather than one after another
+        pending = [table for table in tables or TABLE_COLUMNS if _needs_load(table)]
+        frames = {}
+        if pending:
+            for table in pending:
+                _start_load(table)
+            refreshing = {table for table in pending if table in st.session_state}
+            
+            def load(table):
+                # Reloads after another session's write queue behind writes and first loads
+                with sheets_priority('refresh' if table in refreshing else 'read'):
+                    return storage.load(table)
+            
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                frames = dict(zip(pending, pool.map(load, pending)))
+        
+        unread = [table for table in frames if frames[table] is None]
+        for table in unread:
+            # Keep what the session has (or start empty) and read it again on the next run
+            del frames[table]
+            st.session_state.data_versions[table] = None
+            if table not in st.session_state:
+                st.session_state[table] = apply_schema(table, pd.DataFrame(columns=TABLE_COLUMNS[table]))
+        if unread:
+            st.error(f"⚠️ Could not read {', '.join(unread)} from {storage.describe()}. "
+                     "Showing the last data loaded; it will be read again on your next action.")
+        
+        # Users
+        if 'users' in frames:
+            if frames['users'].empty:
+                # Create default admin if sheet is empty
+                st.session_state.users = _default_users('lyndon@lynsrealestate.com')
+                storage.save('users', st.session_state.users)
             else:
-                st.session_state.listings = listings_df
+                st.session_state.users = frames['users']
         
-        # Load Deals
-        if 'deals' not in st.session_state:
-            deals_df = load_from_sheets(client, config['deals_sheet_id'])
-            if deals_df.empty:
-                st.session_state.deals = pd.DataFrame(columns=[
-                    'Deal_ID', 'Client_ID', 'Listing_ID', 'Brokerage_From_Owner', 'Brokerage_From_Client', 
-                    'Total_Brokerage', 'Number_Of_Brokers', 'Your_Share', 'Partner_Share', 'Partner_Name', 
-                    'Deal_Date', 'Payment_Status', 'Notes'
-                ])
-            else:
-                st.session_state.deals = deals_df
+        # Clients, Listings and Deals fall back to empty tables when a sheet is empty
+        for table, columns in [('clients', CLIENT_COLUMNS), ('listings', LISTING_COLUMNS), ('deals', DEAL_COLUMNS)]:
+            if table in frames:
+                st.session_state[table] = frames[table] if not frames[table].empty else apply_schema(table, pd.DataFrame(columns=columns))
     else:
-        st.error("⚠️ Google Sheets not connected. Running in memory-only mode.")
+        st.error("⚠️ Google Sheets not connected. Running in memory-only mode: changes are not saved "
+                 "and will be lost when you close the app. Reload the page to try connecting again.")
         # Fallback to in-memory mode
         if 'users' not in st.session_state:
-            st.session_state.users = pd.DataFrame([{
-                'Username': 'admin',
-                'Password': hash_password('lyns2024'),
-                'Role': 'Admin',
-                'Full_Name': 'Lyndon',
-                'Email': 'lynsrealestateagency@gmail.com',
-                'Status': 'Active'
-            }])
+            st.session_state.users = _default_users('lynsrealestateagency@gmail.com')
         if 'clients' not in st.session_state:
-            st.session_state.clients = pd.DataFrame(columns=[
-                'Client_ID', 'Client_Name', 'Contact_Number', 'Email', 'Client_Type', 'Property_Category', 
-                'Property_Type', 'Furnishing_Status', 'Budget_Min', 'Budget_Max', 'Budget_Currency', 
-                'Location_Preference', 'BHK_Requirement', 'Requirements_Notes', 'Possession_Date', 
-                'Status', 'Assigned_To', 'Date_Registered', 'Source', 'Priority'
-            ])
+            st.session_state.clients = pd.DataFrame(columns=CLIENT_COLUMNS)
         if 'listings' not in st.session_state:
-            st.session_state.listings = pd.DataFrame(columns=[
-                'Listing_ID', 'Property_Address', 'Location', 'Property_Category', 'Property_Type', 
-                'Furnishing_Status', 'BHK', 'Price', 'Price_Currency', 'Area_SqFt', 'Broker_Name', 
-                'Broker_Contact', 'Amenities', 'Listing_Status', 'Date_Added', 'Visible_To_Partner', 
-                'Notes', 'Assigned_To', 'Shown_To_Clients'
-            ])
+            st.session_state.listings = pd.DataFrame(columns=LISTING_COLUMNS)
         if 'deals' not in st.session_state:
-            st.session_state.deals = pd.DataFrame(columns=[
-                    'Deal_ID', 'Client_ID', 'Listing_ID', 'Brokerage_From_Owner', 'Brokerage_From_Client', 
-                    'Total_Brokerage', 'Number_Of_Brokers', 'Your_Share', 'Partner_Share', 'Partner_Name', 
-                    'Deal_Date', 'Payment_Status', 'Notes'
-                ])
+            st.session_state.deals = pd.DataFrame(columns=DEAL_COLUMNS)
+    
+    # Fold in rows added during the previous run
+    flush_inserts()
 
 def add_user(username, password, role, full_name, email):
-    new_user = pd.DataFrame([{
+    new_user = {
         'Username': username,
         'Password': hash_password(password),
         'Role': role,
         'Full_Name': full_name,
         'Email': email,
         'Status': 'Active'
-    }])
-    st.session_state.users = pd.concat([st.session_state.users, new_user], ignore_index=True)
+    }
+    buffer_insert('users', new_user)
     # Save to Google Sheets
-    if st.session_state.gs_client and st.session_state.gs_config:
-        save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['users_sheet_id'], st.session_state.users)
+    persist_new_rows('users', [new_user])
 
 def authenticate(username, password):
-    users = st.session_state.users
-    user = users[users['Username'] == username]
-    if not user.empty:
-        if user['Status'].values[0] == 'Inactive':
+    user = get_record('users', username)
+    if user is not None:
+        if user['Status'] == 'Inactive':
             return False, None, None  # User is disabled
-        if user['Password'].values[0] == hash_password(password):
-            return True, user['Role'].values[0], user['Full_Name'].values[0]
+        if user['Password'] == hash_password(password):
+            return True, user['Role'], user['Full_Name']
     return False, None, None
 
 def add_client(client_data):
-    client_id = f"C{len(st.session_state.clients) + 1:04d}"
-    new_row = pd.DataFrame([{
+    client_id = next_id('clients', 'C')
+    new_row = {
         'Client_ID': client_id, 'Client_Name': client_data['name'], 
         'Contact_Number': client_data['contact'], 'Email': client_data['email'],
         'Client_Type': client_data['client_type'], 'Property_Category': client_data['property_category'],
@@ -254,11 +2084,10 @@ def add_client(client_data):
         'Possession_Date': client_data.get('possession_date', ''), 'Status': 'New Lead', 
         'Assigned_To': client_data['assigned_to'], 'Date_Registered': datetime.now().strftime('%Y-%m-%d'),
         'Source': client_data['source'], 'Priority': client_data['priority']
-    }])
-    st.session_state.clients = pd.concat([st.session_state.clients, new_row], ignore_index=True)
+    }
+    buffer_insert('clients', new_row)
     # Save to Google Sheets
-    if st.session_state.gs_client and st.session_state.gs_config:
-        save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['clients_sheet_id'], st.session_state.clients)
+    persist_new_rows('clients', [new_row])
     
     # Send email notification if assigned to a partner
     if client_data['assigned_to'] != 'Unassigned' and client_data['assigned_to'] != 'Admin':
@@ -286,12 +2115,14 @@ def add_client(client_data):
             </body>
             </html>
             """
-            send_email_notification(partner_email, subject, body)
+            assigned = client_data['assigned_to']
+            after_commit(lambda: send_email_notification(
+                partner_email, subject, body, key=f"client-assigned:{client_id}:{assigned}:v{saved_version('clients', client_id)}"))
     return client_id
 
 def add_listing(listing_data):
-    listing_id = f"L{len(st.session_state.listings) + 1:04d}"
-    new_row = pd.DataFrame([{
+    listing_id = next_id('listings', 'L')
+    new_row = {
         'Listing_ID': listing_id, 'Property_Address': listing_data['address'], 
         'Location': listing_data['location'], 'Property_Category': listing_data['property_category'], 
         'Property_Type': listing_data['property_type'],
@@ -303,15 +2134,14 @@ def add_listing(listing_data):
         'Date_Added': datetime.now().strftime('%Y-%m-%d'),
         'Visible_To_Partner': listing_data['visible_to_partner'], 'Notes': listing_data['notes'],
         'Assigned_To': listing_data.get('assigned_to', 'Unassigned'), 'Shown_To_Clients': ''
-    }])
-    st.session_state.listings = pd.concat([st.session_state.listings, new_row], ignore_index=True)
+    }
+    buffer_insert('listings', new_row)
     # Save to Google Sheets
-    if st.session_state.gs_client and st.session_state.gs_config:
-        save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['listings_sheet_id'], st.session_state.listings)
+    persist_new_rows('listings', [new_row])
     return listing_id
 
 def add_deal(deal_data):
-    deal_id = f"D{len(st.session_state.deals) + 1:04d}"
+    deal_id = next_id('deals', 'D')
     
     # Calculate: Total = Owner + Client
     total_brokerage = deal_data['brokerage_owner'] + deal_data['brokerage_client']
@@ -322,7 +2152,7 @@ def add_deal(deal_data):
     your_share = brokerage_per_broker * 0.90
     partner_share = brokerage_per_broker * 0.10
     
-    new_deal = pd.DataFrame([{
+    new_deal = {
         'Deal_ID': deal_id,
         'Client_ID': deal_data['client_id'],
         'Listing_ID': deal_data['listing_id'],
@@ -336,35 +2166,43 @@ def add_deal(deal_data):
         'Deal_Date': datetime.now().strftime('%Y-%m-%d'),
         'Payment_Status': 'Pending',
         'Notes': deal_data.get('notes', '')
-    }])
-    st.session_state.deals = pd.concat([st.session_state.deals, new_deal], ignore_index=True)
+    }
+    buffer_insert('deals', new_deal)
     # Save to Google Sheets
-    if st.session_state.gs_client and st.session_state.gs_config:
-        save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['deals_sheet_id'], st.session_state.deals)
+    persist_new_rows('deals', [new_deal])
     return deal_id
 
 def delete_client(client_id):
-    st.session_state.clients = st.session_state.clients[st.session_state.clients['Client_ID'] != client_id]
-    # Save to Google Sheets
-    if st.session_state.gs_client and st.session_state.gs_config:
-        save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['clients_sheet_id'], st.session_state.clients)
+    if delete_record('clients', client_id):
+        # Save to Google Sheets
+        persist_deleted('clients', [client_id])
 
 def delete_listing(listing_id):
-    st.session_state.listings = st.session_state.listings[st.session_state.listings['Listing_ID'] != listing_id]
-    # Save to Google Sheets
-    if st.session_state.gs_client and st.session_state.gs_config:
-        save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['listings_sheet_id'], st.session_state.listings)
+    if delete_record('listings', listing_id):
+        # Save to Google Sheets
+        persist_deleted('listings', [listing_id])
+
+def delete_deal(deal_id):
+    if delete_record('deals', deal_id):
+        persist_deleted('deals', [deal_id])
+
+def delete_user(username):
+    if delete_record('users', username):
+        persist_deleted('users', [username])
 
 def update_client_status(client_id, new_status):
-    st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Status'] = new_status
+    current = get_record('clients', client_id)
+    # Re-submitting the status the client already has saves and sends nothing
+    if current is None or current['Status'] == new_status:
+        return
+    patch_record('clients', client_id, {'Status': new_status})
     # Save to Google Sheets
-    if st.session_state.gs_client and st.session_state.gs_config:
-        save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['clients_sheet_id'], st.session_state.clients)
+    if not persist_rows('clients', [client_id]):
+        return
     
-    # Send email notification to admin about status update
-    client = st.session_state.clients[st.session_state.clients['Client_ID'] == client_id]
-    if not client.empty:
-        client_info = client.iloc[0]
+    # Send email notification to admin about status update, once the change is saved
+    client_info = get_record('clients', client_id)
+    if client_info is not None:
         admin_users = st.session_state.users[st.session_state.users['Role'] == 'Admin']
         if not admin_users.empty:
             admin_email = admin_users.iloc[0]['Email']
@@ -381,15 +2219,211 @@ def update_client_status(client_id, new_status):
             </body>
             </html>
             """
-            send_email_notification(admin_email, subject, body)
+            after_commit(lambda: send_email_notification(
+                admin_email, subject, body, key=f"client-status:{client_id}:{new_status}:v{saved_version('clients', client_id)}"))
 
 def update_listing_status(listing_id, new_status, shown_to_clients=''):
-    st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Listing_Status'] = new_status
+    values = {'Listing_Status': new_status}
     if shown_to_clients:
-        st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Shown_To_Clients'] = shown_to_clients
+        values['Shown_To_Clients'] = shown_to_clients
+    if not patch_record('listings', listing_id, values):
+        return
     # Save to Google Sheets
-    if st.session_state.gs_client and st.session_state.gs_config:
-        save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['listings_sheet_id'], st.session_state.listings)
+    persist_rows('listings', [listing_id])
+
+# Counters and sums behind the dashboards and reports, kept up to date by every insert,
+# patch and delete instead of being recomputed from the tables on each rerun
+TABLE_AGGREGATES = {
+    'clients': {'count': ['Status', 'Client_Type', 'Property_Category', 'Priority', 'Assigned_To', 'Source'],
+                'owner_count': ['Status'], 'sum': [], 'owner_sum': []},
+    'listings': {'count': ['Listing_Status', 'Location'], 'owner_count': ['Visible_To_Partner'], 'sum': [], 'owner_sum': []},
+    'deals': {'count': ['Payment_Status'], 'owner_count': ['Payment_Status'],
+              'sum': ['Total_Brokerage', 'Your_Share', 'Partner_Share'], 'owner_sum': ['Partner_Share']},
+}
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if value != value else value
+
+def _contributions(table, row):
+    spec = TABLE_AGGREGATES[table]
+    owner = _owner_key(row.get(OWNER_COLUMNS[table], ''))
+    buckets = [(('owner_rows', owner), 1)]
+    for column in spec['count']:
+        if row.get(column) == row.get(column):
+            buckets.append((('count', column, row.get(column)), 1))
+    for column in spec['owner_count']:
+        if row.get(column) == row.get(column):
+            buckets.append((('owner_count', owner, column, row.get(column)), 1))
+    buckets += [(('sum', column), _number(row.get(column))) for column in spec['sum']]
+    buckets += [(('owner_sum', owner, column), _number(row.get(column))) for column in spec['owner_sum']]
+    return buckets
+
+def _aggregate(index, table, rows, sign):
+    totals = index.get('totals')
+    if totals is not None:
+        for row in rows:
+            for bucket, amount in _contributions(table, row):
+                totals[bucket] = totals.get(bucket, 0) + sign * amount
+    if index.get('rollups') is not None:
+        _roll(index['rollups'], table, rows, sign)
+
+def _totals(table):
+    flush_inserts(table)
+    index = _row_index(table)
+    if 'totals' not in index:
+        # Built with grouped pandas operations once; later writes adjust the numbers in place
+        df, spec, totals = index['frame'], TABLE_AGGREGATES[table], {}
+        owners = df[OWNER_COLUMNS[table]].astype(str).str.strip().str.casefold() if OWNER_COLUMNS[table] in df \
+            else pd.Series('', index=df.index)
+        totals.update((('owner_rows', owner), count) for owner, count in owners.value_counts().items())
+        for column in [c for c in spec['count'] if c in df]:
+            totals.update((('count', column, value), count) for value, count in df[column].value_counts().items())
+        for column in [c for c in spec['owner_count'] if c in df]:
+            counts = df.groupby([owners, df[column]], observed=True).size()
+            totals.update((('owner_count', owner, column, value), count) for (owner, value), count in counts.items())
+        for column in [c for c in spec['sum'] if c in df]:
+            totals[('sum', column)] = float(pd.to_numeric(df[column], errors='coerce').sum())
+        for column in [c for c in spec['owner_sum'] if c in df]:
+            sums = pd.to_numeric(df[column], errors='coerce').groupby(owners).sum()
+            totals.update((('owner_sum', owner, column), float(total)) for owner, total in sums.items())
+        index['totals'] = totals
+    return index['totals']
+
+def count_by(table, column, owner=None):
+    # Same shape as value_counts(): non-zero counts, largest first
+    if owner is None:
+        counts = {bucket[2]: n for bucket, n in _totals(table).items() if bucket[:2] == ('count', column) and n}
+    else:
+        prefix = ('owner_count', _owner_key(owner), column)
+        counts = {bucket[3]: n for bucket, n in _totals(table).items() if bucket[:3] == prefix and n}
+    return pd.Series(counts, dtype='int64', name='count').sort_values(ascending=False, kind='stable')
+
+def total_of(table, column, owner=None):
+    if owner is None:
+        return _totals(table).get(('sum', column), 0)
+    return _totals(table).get(('owner_sum', _owner_key(owner), column), 0)
+
+def owned_count(table, owner):
+    return _totals(table).get(('owner_rows', _owner_key(owner)), 0)
+
+# Time-series rollups for the report trends: row counts per period broken down by a few
+# columns, and amount sums per period. Dates are parsed once when the rollups are built,
+# and later writes only add or remove their own row's contribution.
+ROLLUP_FREQUENCIES = {'Daily': 'D', 'Weekly': 'W-MON', 'Monthly': 'MS'}
+
+TABLE_ROLLUPS = {
+    'clients': {'date': 'Date_Registered', 'by': ['Status', 'Source', 'Location_Preference', 'Assigned_To'], 'sum': []},
+    'listings': {'date': 'Date_Added', 'by': ['Listing_Status', 'Location', 'Assigned_To'], 'sum': []},
+    'deals': {'date': 'Deal_Date', 'by': ['Partner_Name', 'Payment_Status'],
+              'sum': ['Total_Brokerage', 'Your_Share', 'Partner_Share']},
+}
+
+# Columns holding a comma-separated list; each entry counts separately
+MULTI_VALUE_COLUMNS = {'Location_Preference'}
+
+def _period_starts(dates, freq):
+    dates = pd.to_datetime(dates, errors='coerce', format='ISO8601').dt.normalize()
+    if freq == 'Weekly':
+        return dates - pd.to_timedelta(dates.dt.weekday, unit='D')
+    if freq == 'Monthly':
+        return dates - pd.to_timedelta(dates.dt.day - 1, unit='D')
+    return dates
+
+def _bump(buckets, key, amount):
+    total = buckets.get(key, 0) + amount
+    if abs(total) < 1e-9:
+        buckets.pop(key, None)
+    else:
+        buckets[key] = total
+
+def _rollups(table):
+    flush_inserts(table)
+    index = _row_index(table)
+    if 'rollups' not in index:
+        df, spec, rollups = index['frame'], TABLE_ROLLUPS[table], {}
+        dates = df[spec['date']] if spec['date'] in df else pd.Series('', index=df.index)
+        for freq in ROLLUP_FREQUENCIES:
+            periods = _period_starts(dates, freq)
+            valid = periods.notna()
+            buckets = rollups[freq] = {'rows': periods[valid].value_counts().to_dict()}
+            for column in [c for c in spec['by'] if c in df]:
+                frame = pd.DataFrame({'period': periods, 'value': df[column]})[valid]
+                if column in MULTI_VALUE_COLUMNS:
+                    frame = frame.assign(value=frame['value'].astype(str).str.split(',')).explode('value')
+                    frame['value'] = frame['value'].str.strip()
+                    frame = frame[frame['value'] != '']
+                buckets[('by', column)] = frame.groupby(['period', 'value'], observed=True).size().to_dict()
+            for column in [c for c in spec['sum'] if c in df]:
+                sums = pd.to_numeric(df[column], errors='coerce')[valid].groupby(periods[valid]).sum()
+                buckets[('sum', column)] = sums.to_dict()
+        index['rollups'] = rollups
+    return index['rollups']
+
+def _roll(rollups, table, rows, sign):
+    spec = TABLE_ROLLUPS[table]
+    for row in rows:
+        for freq, buckets in rollups.items():
+            period = _period_starts(pd.Series([row.get(spec['date'], '')]), freq).iloc[0]
+            if pd.isna(period):
+                continue
+            _bump(buckets['rows'], period, sign)
+            for column in spec['by']:
+                value = row.get(column)
+                if pd.isna(value):
+                    continue
+                values = [v.strip() for v in str(value).split(',') if v.strip()] if column in MULTI_VALUE_COLUMNS else [value]
+                for value in values:
+                    _bump(buckets.setdefault(('by', column), {}), (period, value), sign)
+            for column in spec['sum']:
+                _bump(buckets.setdefault(('sum', column), {}), period, sign * _number(row.get(column)))
+
+def rollup(table, freq, by=None, total=None):
+    # Counts per period (one column per value of `by`), or the sum of `total` per period,
+    # with empty periods filled in as zeros
+    buckets = _rollups(table)[freq]
+    if by:
+        counts = pd.Series(buckets.get(('by', by), {}), dtype='float64')
+        series = counts.unstack(fill_value=0) if not counts.empty else pd.DataFrame()
+    elif total:
+        series = pd.Series(buckets.get(('sum', total), {}), dtype='float64')
+    else:
+        series = pd.Series(buckets['rows'], dtype='float64')
+    if series.empty:
+        return series
+    periods = pd.date_range(series.index.min(), series.index.max(), freq=ROLLUP_FREQUENCIES[freq])
+    return series.sort_index().reindex(periods, fill_value=0)
+
+def partner_clients(partner_name):
+    return owned_rows('clients', partner_name)
+
+def partner_listings(partner_name):
+    listings = owned_rows('listings', partner_name)
+    return listings[listings['Visible_To_Partner'] == 'Yes']
+
+def partner_deals(partner_name):
+    return owned_rows('deals', partner_name)
+
+def admin_summary():
+    flush_inserts()
+    return {
+        'total_clients': len(st.session_state.clients),
+        'total_listings': len(st.session_state.listings),
+        'deals_closed': len(st.session_state.deals),
+        'total_brokerage': total_of('deals', 'Total_Brokerage'),
+        'status_counts': count_by('clients', 'Status')
+    }
+
+def partner_summary(partner_name):
+    return {
+        'clients': owned_count('clients', partner_name),
+        'listings': int(count_by('listings', 'Visible_To_Partner', partner_name).get('Yes', 0)),
+        'commission': total_of('deals', 'Partner_Share', partner_name),
+        'status_counts': count_by('clients', 'Status', partner_name)
+    }
 
 def initialize_session_state():
     if 'logged_in' not in st.session_state:
@@ -429,6 +2463,10 @@ def admin_dashboard():
     st.sidebar.markdown(f"**Role:** {st.session_state.user_role}")
     menu = st.sidebar.radio("Navigation", 
         ["📊 Dashboard", "👥 Clients", "🏢 Listings", "💰 Deals", "👤 Users", "📈 Reports"])
+    show_sync_status()
+    if st.sidebar.button("🔄 Refresh Data"):
+        refresh_data()
+        st.rerun()
     if st.sidebar.button("🚪 Logout"):
         logout()
     
@@ -449,21 +2487,19 @@ def show_admin_dashboard():
     st.markdown('<div class="main-header">📊 Admin Dashboard</div>', unsafe_allow_html=True)
     
     clients_df = st.session_state.clients
-    listings_df = st.session_state.listings
     deals_df = st.session_state.deals
+    summary = admin_summary()
     
     # Summary Metrics
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.markdown(f'<div class="metric-card"><h3>{len(clients_df)}</h3><p>Total Clients</p></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-card"><h3>{summary["total_clients"]}</h3><p>Total Clients</p></div>', unsafe_allow_html=True)
     with col2:
-        st.markdown(f'<div class="metric-card"><h3>{len(listings_df)}</h3><p>Total Listings</p></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-card"><h3>{summary["total_listings"]}</h3><p>Total Listings</p></div>', unsafe_allow_html=True)
     with col3:
-        deals_closed = len(deals_df)
-        st.markdown(f'<div class="metric-card"><h3>{deals_closed}</h3><p>Deals Closed</p></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-card"><h3>{summary["deals_closed"]}</h3><p>Deals Closed</p></div>', unsafe_allow_html=True)
     with col4:
-        total_brokerage = deals_df['Total_Brokerage'].sum() if not deals_df.empty else 0
-        st.markdown(f'<div class="metric-card"><h3>₹{total_brokerage:,.0f}</h3><p>Total Brokerage</p></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-card"><h3>₹{summary["total_brokerage"]:,.0f}</h3><p>Total Brokerage</p></div>', unsafe_allow_html=True)
     
     st.markdown("---")
     
@@ -472,7 +2508,7 @@ def show_admin_dashboard():
         st.subheader("📊 Client Status Breakdown")
         col1, col2 = st.columns(2)
         with col1:
-            status_counts = clients_df['Status'].value_counts()
+            status_counts = summary['status_counts']
             for status, count in status_counts.items():
                 st.metric(status, count)
         with col2:
@@ -485,34 +2521,109 @@ def show_admin_dashboard():
     with col1:
         st.subheader("📋 Recent Clients")
         if not clients_df.empty:
-            st.dataframe(clients_df.tail(5), use_container_width=True, hide_index=True)
+            st.dataframe(clients_df.tail(5).drop(columns=[ROW_VERSION], errors='ignore'), use_container_width=True, hide_index=True)
         else:
             st.info("No clients yet")
     
     with col2:
         st.subheader("💰 Recent Deals")
         if not deals_df.empty:
-            st.dataframe(deals_df.tail(5), use_container_width=True, hide_index=True)
+            st.dataframe(deals_df.tail(5).drop(columns=[ROW_VERSION], errors='ignore'), use_container_width=True, hide_index=True)
         else:
             st.info("No deals yet")
 
 
+# Data grids filter, sort and page on the server and only send the visible page
+GRID_PAGE_SIZES = [25, 50, 100, 250]
+
+GRID_FILTERS = {
+    'clients': ['Status', 'Assigned_To', 'Client_Type', 'Priority'],
+    'listings': ['Listing_Status', 'Location', 'Assigned_To', 'Visible_To_Partner'],
+    'deals': ['Partner_Name', 'Payment_Status'],
+}
+
+# Columns each role sees; roles not listed see every column
+GRID_COLUMNS = {
+    'clients': {'Partner': [
+        'Client_ID', 'Client_Name', 'Contact_Number', 'Email', 'Client_Type', 'Property_Category',
+        'Property_Type', 'Furnishing_Status', 'Budget_Min', 'Budget_Max', 'Budget_Currency',
+        'Location_Preference', 'BHK_Requirement', 'Requirements_Notes', 'Possession_Date',
+        'Status', 'Date_Registered', 'Priority'
+    ]},
+}
+
+def filter_rows(df, filters):
+    for column, values in filters.items():
+        if values:
+            df = df[df[column].isin(values)]
+    return df
+
+def page_rows(df, page, page_size, sort_by=None, ascending=True, columns=None):
+    if sort_by:
+        try:
+            df = df.sort_values(sort_by, ascending=ascending, kind='stable')
+        except TypeError:
+            # Mixed text and numbers (e.g. blank cells from Sheets)
+            df = df.sort_values(sort_by, ascending=ascending, kind='stable', key=lambda s: s.astype(str))
+    start = (page - 1) * page_size
+    df = df.iloc[start:start + page_size]
+    if columns:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+def show_data_grid(table, df=None):
+    df = st.session_state[table] if df is None else df
+    columns = GRID_COLUMNS.get(table, {}).get(st.session_state.user_role) or [c for c in df.columns if c != ROW_VERSION]
+    
+    filter_columns = [c for c in GRID_FILTERS.get(table, []) if c in df.columns and c in columns]
+    cols = st.columns(len(filter_columns) + 1)
+    filters = {}
+    for col, column in zip(cols, filter_columns):
+        with col:
+            options = sorted(df[column].dropna().unique(), key=str)
+            filters[column] = st.multiselect(column.replace('_', ' '), options, key=f"grid_{table}_{column}")
+    with cols[-1]:
+        sort_by = st.selectbox("Sort by", ["(none)"] + columns, key=f"grid_{table}_sort")
+    
+    df = filter_rows(df, filters)
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        descending = st.checkbox("Descending", key=f"grid_{table}_desc")
+    with col2:
+        page_size = st.selectbox("Rows per page", GRID_PAGE_SIZES, index=1, key=f"grid_{table}_size")
+    pages = max(1, -(-len(df) // page_size))
+    page_key = f"grid_{table}_page"
+    # A filter or page size that leaves fewer pages moves the grid back onto the last one
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    with col3:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=page_key)
+    
+    st.dataframe(page_rows(df, page, page_size, None if sort_by == "(none)" else sort_by, not descending, columns),
+                 use_container_width=True, hide_index=True)
+    start = (page - 1) * page_size
+    st.caption(f"Showing {min(start + 1, len(df))}–{min(start + page_size, len(df))} of {len(df):,}")
+
 def show_clients_page(is_admin):
     st.markdown('<div class="main-header">👥 Clients</div>', unsafe_allow_html=True)
     tab1, tab2, tab3 = st.tabs(["📋 View & Manage", "➕ Add New", "✏️ Edit Listing"])
     
     with tab1:
         if not st.session_state.clients.empty:
-            st.dataframe(st.session_state.clients, use_container_width=True, hide_index=True)
+            query = st.text_input("🔍 Search clients", placeholder="Name, phone, location, requirements...", key="search_clients")
+            if query:
+                show_data_grid('clients', search_records('clients', query))
+            else:
+                show_data_grid('clients')
             
             if is_admin:
                 st.markdown("### 🗑️ Delete Client")
-                del_client = st.selectbox("Select client to delete", 
-                                         st.session_state.clients['Client_Name'].tolist())
+                client_names = dict(zip(st.session_state.clients['Client_ID'], st.session_state.clients['Client_Name']))
+                client_id = st.selectbox("Select client to delete", list(client_names),
+                                         format_func=client_names.get)
                 if st.button("🗑️ Delete Selected Client", type="secondary"):
-                    client_id = st.session_state.clients[st.session_state.clients['Client_Name'] == del_client]['Client_ID'].values[0]
                     delete_client(client_id)
-                    st.success(f"✅ Deleted: {del_client}")
+                    st.success(f"✅ Deleted: {client_names[client_id]}")
                     st.rerun()
         else:
             st.info("No clients yet!")
@@ -544,7 +2655,16 @@ def show_edit_client_form():
                      for _, r in st.session_state.clients.iterrows()}
     selected = st.selectbox("Select Client to Edit", list(client_options.keys()), key="edit_client_sel")
     client_id = client_options[selected]
-    client = st.session_state.clients[st.session_state.clients['Client_ID'] == client_id].iloc[0]
+    client = get_record('clients', client_id)
+    
+    matches = listing_matches(client_id)
+    with st.expander(f"🎯 Matching listings ({len(matches)})"):
+        if matches.empty:
+            st.info("No available listings match this client yet")
+        else:
+            st.dataframe(matches[['Match_Score', 'Listing_ID', 'Property_Address', 'Location', 'BHK', 'Price',
+                                  'Price_Currency', 'Listing_Status', 'Assigned_To']],
+                         use_container_width=True, hide_index=True)
     
     # Pre-select values outside form for dynamic updates
     client_type_temp = st.selectbox("Client Type *", ["Sale", "Rental"],
@@ -646,30 +2766,31 @@ def show_edit_client_form():
         if st.form_submit_button("✅ Update Client", use_container_width=True):
             if name and contact and location:
                 location_str = ", ".join(location)
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Client_Name'] = name
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Contact_Number'] = contact
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Email'] = email
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Client_Type'] = client_type
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Property_Category'] = property_category
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Property_Type'] = property_type
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Furnishing_Status'] = furnishing if furnishing else 'N/A'
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Budget_Min'] = bmin
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Budget_Max'] = bmax
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Budget_Currency'] = currency
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Location_Preference'] = location_str
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'BHK_Requirement'] = bhk
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Requirements_Notes'] = requirements
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Possession_Date'] = poss_date.strftime('%Y-%m-%d') if poss_date else ''
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Assigned_To'] = assigned
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Source'] = source
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Priority'] = priority
-                st.session_state.clients.loc[st.session_state.clients['Client_ID'] == client_id, 'Status'] = status
+                patch_record('clients', client_id, {
+                    'Client_Name': name,
+                    'Contact_Number': contact,
+                    'Email': email,
+                    'Client_Type': client_type,
+                    'Property_Category': property_category,
+                    'Property_Type': property_type,
+                    'Furnishing_Status': furnishing if furnishing else 'N/A',
+                    'Budget_Min': bmin,
+                    'Budget_Max': bmax,
+                    'Budget_Currency': currency,
+                    'Location_Preference': location_str,
+                    'BHK_Requirement': bhk,
+                    'Requirements_Notes': requirements,
+                    'Possession_Date': poss_date.strftime('%Y-%m-%d') if poss_date else '',
+                    'Assigned_To': assigned,
+                    'Source': source,
+                    'Priority': priority,
+                    'Status': status,
+                })
                 
-                if st.session_state.gs_client and st.session_state.gs_config:
-                    save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['clients_sheet_id'], st.session_state.clients)
+                saved = persist_rows('clients', [client_id])
                 
                 # Send email notification if assigned to a partner (and assignment changed)
-                if assigned != client['Assigned_To'] and assigned != 'Unassigned' and assigned != 'Admin':
+                if saved and assigned != client['Assigned_To'] and assigned != 'Unassigned' and assigned != 'Admin':
                     partner = st.session_state.users[st.session_state.users['Full_Name'] == assigned]
                     if not partner.empty:
                         partner_email = partner.iloc[0]['Email']
@@ -693,7 +2814,8 @@ def show_edit_client_form():
                         </body>
                         </html>
                         """
-                        send_email_notification(partner_email, subject, body)
+                        send_email_notification(partner_email, subject, body,
+                                                key=f"client-assigned:{client_id}:{assigned}:v{saved_version('clients', client_id)}")
                 
                 st.success(f"✅ Client {name} updated!")
                 st.balloons()
@@ -795,16 +2917,20 @@ def show_listings_page(is_admin):
     
     with tab1:
         if not st.session_state.listings.empty:
-            st.dataframe(st.session_state.listings, use_container_width=True, hide_index=True)
+            query = st.text_input("🔍 Search listings", placeholder="Address, location, amenities, notes...", key="search_listings")
+            if query:
+                show_data_grid('listings', search_records('listings', query))
+            else:
+                show_data_grid('listings')
             
             if is_admin:
                 st.markdown("### 🗑️ Delete Listing")
-                del_listing = st.selectbox("Select listing to delete", 
-                                          st.session_state.listings['Property_Address'].tolist())
+                addresses = dict(zip(st.session_state.listings['Listing_ID'], st.session_state.listings['Property_Address']))
+                listing_id = st.selectbox("Select listing to delete", list(addresses),
+                                          format_func=addresses.get)
                 if st.button("🗑️ Delete Selected Listing", type="secondary"):
-                    listing_id = st.session_state.listings[st.session_state.listings['Property_Address'] == del_listing]['Listing_ID'].values[0]
                     delete_listing(listing_id)
-                    st.success(f"✅ Deleted: {del_listing}")
+                    st.success(f"✅ Deleted: {addresses[listing_id]}")
                     st.rerun()
         else:
             st.info("No listings yet!")
@@ -834,7 +2960,16 @@ def show_edit_listing_form():
                       for _, r in st.session_state.listings.iterrows()}
     selected = st.selectbox("Select Listing to Edit", list(listing_options.keys()), key="edit_listing_sel")
     listing_id = listing_options[selected]
-    listing = st.session_state.listings[st.session_state.listings['Listing_ID'] == listing_id].iloc[0]
+    listing = get_record('listings', listing_id)
+    
+    matches = client_matches(listing_id)
+    with st.expander(f"🎯 Matching clients ({len(matches)})"):
+        if matches.empty:
+            st.info("No clients match this listing yet")
+        else:
+            st.dataframe(matches[['Match_Score', 'Client_ID', 'Client_Name', 'Contact_Number', 'Location_Preference',
+                                  'BHK_Requirement', 'Budget_Min', 'Budget_Max', 'Budget_Currency', 'Status', 'Assigned_To']],
+                         use_container_width=True, hide_index=True)
     
     # Pre-select for dynamic updates
     cat_temp = st.selectbox("Property Category *", ["Residential", "Commercial"],
@@ -915,25 +3050,26 @@ def show_edit_listing_form():
         
         if st.form_submit_button("✅ Update Listing", use_container_width=True):
             if addr and loc and bname and bcontact and bhk:
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Property_Address'] = addr
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Location'] = loc
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Property_Category'] = cat
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Property_Type'] = ptype
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Furnishing_Status'] = furn if furn else 'N/A'
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'BHK'] = bhk
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Price'] = pr
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Price_Currency'] = curr
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Area_SqFt'] = area
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Broker_Name'] = bname
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Broker_Contact'] = bcontact
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Amenities'] = amen
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Listing_Status'] = status
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Visible_To_Partner'] = vis
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Notes'] = notes
-                st.session_state.listings.loc[st.session_state.listings['Listing_ID'] == listing_id, 'Assigned_To'] = assigned
+                patch_record('listings', listing_id, {
+                    'Property_Address': addr,
+                    'Location': loc,
+                    'Property_Category': cat,
+                    'Property_Type': ptype,
+                    'Furnishing_Status': furn if furn else 'N/A',
+                    'BHK': bhk,
+                    'Price': pr,
+                    'Price_Currency': curr,
+                    'Area_SqFt': area,
+                    'Broker_Name': bname,
+                    'Broker_Contact': bcontact,
+                    'Amenities': amen,
+                    'Listing_Status': status,
+                    'Visible_To_Partner': vis,
+                    'Notes': notes,
+                    'Assigned_To': assigned,
+                })
                 
-                if st.session_state.gs_client and st.session_state.gs_config:
-                    save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['listings_sheet_id'], st.session_state.listings)
+                persist_rows('listings', [listing_id])
                 
                 st.success(f"✅ Listing {addr} updated!")
                 st.balloons()
@@ -1012,7 +3148,7 @@ def show_deals_page():
     
     with tab1:
         if not st.session_state.deals.empty:
-            st.dataframe(st.session_state.deals, use_container_width=True, hide_index=True)
+            show_data_grid('deals')
             
             st.markdown("### 🗑️ Delete Deal")
             del_deal = st.selectbox("Select deal to delete", 
@@ -1025,9 +3161,9 @@ def show_deals_page():
             
             # Commission Summary
             st.markdown("### 💰 Commission Summary")
-            total_brokerage = st.session_state.deals['Total_Brokerage'].sum()
-            your_total = st.session_state.deals['Your_Share'].sum()
-            partner_total = st.session_state.deals['Partner_Share'].sum()
+            total_brokerage = total_of('deals', 'Total_Brokerage')
+            your_total = total_of('deals', 'Your_Share')
+            partner_total = total_of('deals', 'Partner_Share')
             
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -1058,7 +3194,7 @@ def show_edit_deal_form():
                    for _, r in st.session_state.deals.iterrows()}
     selected = st.selectbox("Select Deal to Edit", list(deal_options.keys()), key="edit_deal_sel")
     deal_id = deal_options[selected]
-    deal = st.session_state.deals[st.session_state.deals['Deal_ID'] == deal_id].iloc[0]
+    deal = get_record('deals', deal_id)
     
     with st.form("edit_deal_form_main"):
         st.info(f"Editing: **{deal_id}**")
@@ -1118,18 +3254,19 @@ def show_edit_deal_form():
         
         if st.form_submit_button("✅ Update Deal", use_container_width=True):
             if partner_name != "No partners":
-                st.session_state.deals.loc[st.session_state.deals['Deal_ID'] == deal_id, 'Brokerage_From_Owner'] = brk_owner
-                st.session_state.deals.loc[st.session_state.deals['Deal_ID'] == deal_id, 'Brokerage_From_Client'] = brk_client
-                st.session_state.deals.loc[st.session_state.deals['Deal_ID'] == deal_id, 'Total_Brokerage'] = total_brokerage
-                st.session_state.deals.loc[st.session_state.deals['Deal_ID'] == deal_id, 'Number_Of_Brokers'] = num_brokers
-                st.session_state.deals.loc[st.session_state.deals['Deal_ID'] == deal_id, 'Your_Share'] = your_share
-                st.session_state.deals.loc[st.session_state.deals['Deal_ID'] == deal_id, 'Partner_Share'] = partner_share
-                st.session_state.deals.loc[st.session_state.deals['Deal_ID'] == deal_id, 'Partner_Name'] = partner_name
-                st.session_state.deals.loc[st.session_state.deals['Deal_ID'] == deal_id, 'Payment_Status'] = payment_status
-                st.session_state.deals.loc[st.session_state.deals['Deal_ID'] == deal_id, 'Notes'] = notes
+                patch_record('deals', deal_id, {
+                    'Brokerage_From_Owner': brk_owner,
+                    'Brokerage_From_Client': brk_client,
+                    'Total_Brokerage': total_brokerage,
+                    'Number_Of_Brokers': num_brokers,
+                    'Your_Share': your_share,
+                    'Partner_Share': partner_share,
+                    'Partner_Name': partner_name,
+                    'Payment_Status': payment_status,
+                    'Notes': notes,
+                })
                 
-                if st.session_state.gs_client and st.session_state.gs_config:
-                    save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['deals_sheet_id'], st.session_state.deals)
+                persist_rows('deals', [deal_id])
                 
                 st.success(f"✅ Deal {deal_id} updated!")
                 st.balloons()
@@ -1201,13 +3338,17 @@ def show_close_deal_form():
                 'partner_name': partner_name,
                 'notes': notes
             }
-            deal_id = add_deal(deal_data)
+            # The deal and the client's new status are saved together, or not at all
+            with unit_of_work() as work:
+                deal_id = add_deal(deal_data)
+                update_client_status(client_opts[selected_client], 'Deal Closed')
             
-            # Update client status
-            update_client_status(client_opts[selected_client], 'Deal Closed')
-            
-            st.success(f"✅ Deal closed! ID: {deal_id}")
-            st.balloons()
+            if work['saved']:
+                st.success(f"✅ Deal closed! ID: {deal_id}")
+                st.balloons()
+            else:
+                # Reload the tables; the next run says which rows someone else changed
+                st.rerun()
         else:
             st.error("❌ Select a partner")
 
@@ -1227,7 +3368,7 @@ def show_users_page():
         non_admin_users = st.session_state.users[st.session_state.users['Username'] != 'admin']
         if not non_admin_users.empty:
             user_to_toggle = st.selectbox("Select User", non_admin_users['Username'].tolist(), key="toggle_user")
-            current_status = st.session_state.users[st.session_state.users['Username'] == user_to_toggle]['Status'].values[0]
+            current_status = get_record('users', user_to_toggle)['Status']
             
             col1, col2 = st.columns(2)
             with col1:
@@ -1235,16 +3376,14 @@ def show_users_page():
             with col2:
                 if current_status == 'Active':
                     if st.button("🚫 Disable User", type="secondary"):
-                        st.session_state.users.loc[st.session_state.users['Username'] == user_to_toggle, 'Status'] = 'Inactive'
-                        if st.session_state.gs_client and st.session_state.gs_config:
-                            save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['users_sheet_id'], st.session_state.users)
+                        patch_record('users', user_to_toggle, {'Status': 'Inactive'})
+                        persist_rows('users', [user_to_toggle])
                         st.success(f"✅ User {user_to_toggle} disabled")
                         st.rerun()
                 else:
                     if st.button("✅ Enable User", type="primary"):
-                        st.session_state.users.loc[st.session_state.users['Username'] == user_to_toggle, 'Status'] = 'Active'
-                        if st.session_state.gs_client and st.session_state.gs_config:
-                            save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['users_sheet_id'], st.session_state.users)
+                        patch_record('users', user_to_toggle, {'Status': 'Active'})
+                        persist_rows('users', [user_to_toggle])
                         st.success(f"✅ User {user_to_toggle} enabled")
                         st.rerun()
         else:
@@ -1293,7 +3432,7 @@ def show_users_page():
         st.subheader("Edit User Details")
         
         edit_user = st.selectbox("Select User to Edit", st.session_state.users['Username'].tolist(), key="edit_user_select")
-        user_data = st.session_state.users[st.session_state.users['Username'] == edit_user].iloc[0]
+        user_data = get_record('users', edit_user)
         
         with st.form("edit_user_form"):
             st.info(f"Editing: **{edit_user}**")
@@ -1314,20 +3453,15 @@ def show_users_page():
                 elif edit_password and edit_password != confirm_edit_password:
                     st.error("❌ Passwords don't match")
                 else:
-                    st.session_state.users.loc[st.session_state.users['Username'] == edit_user, 'Full_Name'] = edit_fullname
-                    st.session_state.users.loc[st.session_state.users['Username'] == edit_user, 'Role'] = edit_role
-                    st.session_state.users.loc[st.session_state.users['Username'] == edit_user, 'Email'] = edit_email
+                    values = {'Full_Name': edit_fullname, 'Role': edit_role, 'Email': edit_email}
+                    if edit_password:
+                        values['Password'] = hash_password(edit_password)
+                    patch_record('users', edit_user, values)
                     
                     # Save to Google Sheets
-                    if st.session_state.gs_client and st.session_state.gs_config:
-                        save_to_sheets(st.session_state.gs_client, st.session_state.gs_config['users_sheet_id'], st.session_state.users)
-                    
-                    if edit_password:
-                        st.session_state.users.loc[st.session_state.users['Username'] == edit_user, 'Password'] = hash_password(edit_password)
-                        st.success(f"✅ Updated {edit_user} (including password)")
-                    else:
-                        st.success(f"✅ Updated {edit_user}")
-                    st.balloons()
+                    if persist_rows('users', [edit_user]):
+                        st.success(f"✅ Updated {edit_user}" + (" (including password)" if edit_password else ""))
+                        st.balloons()
                     st.rerun()
 
 
@@ -1342,25 +3476,64 @@ def show_reports():
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Client Type Distribution")
-            st.bar_chart(clients_df['Client_Type'].value_counts())
+            st.bar_chart(count_by('clients', 'Client_Type'))
         with col2:
             st.subheader("Property Category")
-            st.bar_chart(clients_df['Property_Category'].value_counts())
+            st.bar_chart(count_by('clients', 'Property_Category'))
         
         st.markdown("---")
         
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Priority Levels")
-            st.bar_chart(clients_df['Priority'].value_counts())
+            st.bar_chart(count_by('clients', 'Priority'))
         with col2:
             st.subheader("Assignment Status")
-            st.bar_chart(clients_df['Assigned_To'].value_counts())
+            st.bar_chart(count_by('clients', 'Assigned_To'))
         
         st.markdown("---")
         
         st.subheader("Client Status Pipeline")
-        st.bar_chart(clients_df['Status'].value_counts())
+        st.bar_chart(count_by('clients', 'Status'))
+        
+        st.markdown("---")
+        
+        st.subheader("📈 Trends")
+        col1, col2 = st.columns(2)
+        with col1:
+            freq = st.selectbox("Granularity", list(ROLLUP_FREQUENCIES), index=1, key="trend_freq")
+        with col2:
+            breakdowns = {'Status': 'Status', 'Source': 'Source', 'Location': 'Location_Preference', 'Partner': 'Assigned_To'}
+            breakdown = st.selectbox("Break down new leads by", list(breakdowns), key="trend_by")
+        
+        st.markdown("**New leads**")
+        st.bar_chart(rollup('clients', freq, by=breakdowns[breakdown]))
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**Listings added by location**")
+            listings_trend = rollup('listings', freq, by='Location')
+            if not listings_trend.empty:
+                st.bar_chart(listings_trend)
+            else:
+                st.info("No listings yet")
+        with col2:
+            st.markdown("**Deals closed**")
+            deals_trend = rollup('deals', freq)
+            if not deals_trend.empty:
+                st.bar_chart(deals_trend)
+                st.markdown("**Brokerage (₹)**")
+                st.line_chart(rollup('deals', freq, total='Total_Brokerage'))
+            else:
+                st.info("No deals yet")
+        
+        if not listings_df.empty:
+            st.markdown("---")
+            st.subheader("🎯 Best Listing for Each Client")
+            if st.button("Find matches"):
+                matches = best_matches(top_n=1)
+                st.dataframe(matches.sort_values('Match_Score', ascending=False, kind='stable').head(GRID_PAGE_SIZES[-1]),
+                             use_container_width=True, hide_index=True)
     else:
         st.info("📊 No data yet! Add clients to see reports.")
 
@@ -1369,6 +3542,7 @@ def partner_dashboard():
     st.sidebar.markdown(f"### 👤 {st.session_state.user_name}")
     st.sidebar.markdown(f"**Role:** {st.session_state.user_role}")
     menu = st.sidebar.radio("Navigation", ["📊 Dashboard", "👥 My Clients", "🏢 My Listings"])
+    show_sync_status()
     if st.sidebar.button("🚪 Logout"):
         logout()
     
@@ -1383,28 +3557,22 @@ def show_partner_dashboard_home():
     st.markdown('<div class="main-header">📊 Partner Dashboard</div>', unsafe_allow_html=True)
     
     partner_name = st.session_state.user_name
-    my_clients = st.session_state.clients[st.session_state.clients['Assigned_To'].str.contains(partner_name, case=False, na=False)]
-    my_listings = st.session_state.listings[
-        (st.session_state.listings['Assigned_To'].str.contains(partner_name, case=False, na=False)) & 
-        (st.session_state.listings['Visible_To_Partner'] == 'Yes')
-    ]
-    my_deals = st.session_state.deals[st.session_state.deals['Partner_Name'].str.contains(partner_name, case=False, na=False)]
+    summary = partner_summary(partner_name)
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.markdown(f'<div class="metric-card"><h3>{len(my_clients)}</h3><p>My Clients</p></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-card"><h3>{summary["clients"]}</h3><p>My Clients</p></div>', unsafe_allow_html=True)
     with col2:
-        st.markdown(f'<div class="metric-card"><h3>{len(my_listings)}</h3><p>My Listings</p></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-card"><h3>{summary["listings"]}</h3><p>My Listings</p></div>', unsafe_allow_html=True)
     with col3:
-        my_commission = my_deals['Partner_Share'].sum() if not my_deals.empty else 0
-        st.markdown(f'<div class="metric-card"><h3>₹{my_commission:,.0f}</h3><p>My Commission</p></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-card"><h3>₹{summary["commission"]:,.0f}</h3><p>My Commission</p></div>', unsafe_allow_html=True)
     
     st.markdown("---")
     
     # Status breakdown
-    if not my_clients.empty:
+    if summary['clients']:
         st.subheader("📊 My Client Status")
-        status_counts = my_clients['Status'].value_counts()
+        status_counts = summary['status_counts']
         col1, col2 = st.columns(2)
         with col1:
             for status, count in status_counts.items():
@@ -1414,29 +3582,30 @@ def show_partner_dashboard_home():
     
     st.markdown("---")
     
-    if not my_clients.empty:
+    if summary['clients']:
         st.subheader("👥 Recent Clients")
-        st.dataframe(my_clients.tail(5), use_container_width=True, hide_index=True)
+        st.dataframe(partner_clients(partner_name).tail(5).drop(columns=[ROW_VERSION], errors='ignore'),
+                     use_container_width=True, hide_index=True)
 
 def show_partner_clients():
     st.markdown('<div class="main-header">👥 My Clients</div>', unsafe_allow_html=True)
     
     partner_name = st.session_state.user_name
-    my_clients = st.session_state.clients[st.session_state.clients['Assigned_To'].str.contains(partner_name, case=False, na=False)]
+    my_clients = partner_clients(partner_name)
     
     if not my_clients.empty:
-        st.dataframe(my_clients, use_container_width=True, hide_index=True)
+        show_data_grid('clients', my_clients)
         
         st.markdown("### ✏️ Update Client Status")
-        client_to_update = st.selectbox("Select Client", my_clients['Client_Name'].tolist())
+        client_names = dict(zip(my_clients['Client_ID'], my_clients['Client_Name']))
+        client_id = st.selectbox("Select Client", list(client_names), format_func=client_names.get)
         new_status = st.selectbox("New Status", 
             ["New Lead", "Contacted", "Site Visit Scheduled", "Site Visit Done", "Interested", 
              "Negotiation", "Deal in Progress", "On Hold", "Not Interested"])
         
         if st.button("✅ Update Status"):
-            client_id = my_clients[my_clients['Client_Name'] == client_to_update]['Client_ID'].values[0]
             update_client_status(client_id, new_status)
-            st.success(f"✅ Updated {client_to_update} to: {new_status}")
+            st.success(f"✅ Updated {client_names[client_id]} to: {new_status}")
             st.rerun()
     else:
         st.info("📭 No clients assigned yet")
@@ -1445,11 +3614,8 @@ def show_partner_listings():
     st.markdown('<div class="main-header">🏢 My Listings</div>', unsafe_allow_html=True)
     
     partner_name = st.session_state.user_name
-    my_clients = st.session_state.clients[st.session_state.clients['Assigned_To'].str.contains(partner_name, case=False, na=False)]
-    my_listings = st.session_state.listings[
-        (st.session_state.listings['Assigned_To'].str.contains(partner_name, case=False, na=False)) & 
-        (st.session_state.listings['Visible_To_Partner'] == 'Yes')
-    ]
+    my_clients = partner_clients(partner_name)
+    my_listings = partner_listings(partner_name)
     
     if not my_listings.empty:
         for idx, listing in my_listings.iterrows():
@@ -1499,10 +3665,14 @@ def show_partner_listings():
 
 def main():
     initialize_session_state()
-    initialize_data()
     if not st.session_state.logged_in:
+        # The login page only needs the users table; the others load once someone signs in
+        initialize_data(['users'])
         login_page()
-    elif st.session_state.user_role == "Admin":
+        return
+    initialize_data()
+    show_write_conflicts()
+    if st.session_state.user_role == "Admin":
         admin_dashboard()
     else:
         partner_dashboard()
@@ -0,0 +1,383 @@
+import logging
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+import streamlit as st
+
+import lyns_crm_app as app
+from fake_sheets import FakeSheetsClient
+
+# Streamlit warns about the missing runtime on every session_state access
+logging.getLogger('streamlit').setLevel(logging.ERROR)
+
+SHEETS_CONFIG = {'users_sheet_id': 'users', 'clients_sheet_id': 'clients',
+                 'listings_sheet_id': 'listings', 'deals_sheet_id': 'deals'}
+
+
+def client_rows(count):
+    return pd.DataFrame([{**dict.fromkeys(app.CLIENT_COLUMNS, ''), 'Client_ID': f"C{i:04d}",
+                          'Client_Name': f"Client {i}", 'Status': 'New Lead', 'Assigned_To': 'Partner',
+                          'Budget_Min': 10, 'Budget_Max': 20, 'Date_Registered': '2024-01-01'}
+                         for i in range(1, count + 1)])
+
+
+def seed_tables():
+    users = pd.DataFrame([{'Username': 'admin', 'Password': app.hash_password('secret'), 'Role': 'Admin',
+                           'Full_Name': 'Admin', 'Email': 'admin@example.com', 'Status': 'Active'}])
+    return {'users': users, 'clients': client_rows(5),
+            'listings': pd.DataFrame(columns=app.LISTING_COLUMNS), 'deals': pd.DataFrame(columns=app.DEAL_COLUMNS)}
+
+
+def switch(state):
+    # Replaces the session state, returning the one it replaced
+    saved = {key: st.session_state[key] for key in st.session_state}
+    for key in saved:
+        del st.session_state[key]
+    st.session_state.update(state)
+    return saved
+
+
+def new_session(storage):
+    switch({'storage': storage})
+    app.initialize_session_state()
+    app.initialize_data()
+    return switch({})
+
+
+def stored(storage, table):
+    # What the backend itself holds, bypassing the shared copies
+    if isinstance(storage, app.SQLiteStorage):
+        conn = sqlite3.connect(storage.path)
+        try:
+            return pd.read_sql_query(f"SELECT * FROM {table} ORDER BY rowid", conn)
+        finally:
+            conn.close()
+    app._write_queue().flush()
+    rows = storage.client.dump_rows(storage.key(table)[0])
+    return pd.DataFrame(rows[1:], columns=rows[0]) if rows else pd.DataFrame()
+
+
+@pytest.fixture(autouse=True)
+def fresh_process():
+    # Every test starts from empty process-wide caches and session state
+    st.cache_resource.clear()
+    switch({})
+    yield
+    app._write_queue().flush()
+    st.cache_resource.clear()
+    switch({})
+
+
+@pytest.fixture(params=['sqlite', 'fake_sheets'])
+def storage(request, tmp_path):
+    if request.param == 'sqlite':
+        storage = app.SQLiteStorage(str(tmp_path / 'crm.db'))
+    else:
+        storage = app.SheetsStorage(FakeSheetsClient(), dict(SHEETS_CONFIG))
+    for table, df in seed_tables().items():
+        storage.save(table, app.apply_schema(table, df))
+    app._write_queue().flush()
+    return storage
+
+
+@pytest.fixture
+def emails(monkeypatch):
+    sent = []
+    monkeypatch.setattr(app, 'send_email_notification', lambda *args, **kwargs: sent.append((args, kwargs)) or True)
+    return sent
+
+
+# _diff_requests
+
+HEADER = ['Client_ID', 'Client_Name', 'Status']
+ROWS = [HEADER, ['C0001', 'Asha', 'New Lead'], ['C0002', 'Ravi', 'Contacted'], ['C0003', 'Meera', 'On Hold']]
+
+
+def kinds(requests):
+    return [next(iter(request)) for request in requests]
+
+
+def test_diff_edit_writes_only_the_changed_cells():
+    new_rows = [list(row) for row in ROWS]
+    new_rows[2][2] = 'Interested'
+    requests = app._diff_requests(7, ROWS, new_rows)
+    assert kinds(requests) == ['updateCells']
+    update = requests[0]['updateCells']
+    assert update['start'] == {'sheetId': 7, 'rowIndex': 2, 'columnIndex': 2}
+    assert len(update['rows']) == 1 and len(update['rows'][0]['values']) == 1
+
+
+def test_diff_delete_removes_rows_bottom_up():
+    new_rows = [ROWS[0], ROWS[2]]
+    requests = app._diff_requests(7, ROWS, new_rows)
+    assert kinds(requests) == ['deleteDimension', 'deleteDimension']
+    starts = [request['deleteDimension']['range']['startIndex'] for request in requests]
+    assert starts == [3, 1]
+
+
+def test_diff_append_adds_new_rows_at_the_end():
+    new_rows = ROWS + [['C0004', 'Kiran', 'New Lead']]
+    requests = app._diff_requests(7, ROWS, new_rows)
+    assert kinds(requests) == ['appendCells']
+    assert len(requests[0]['appendCells']['rows']) == 1
+
+
+def test_diff_without_changes_is_empty():
+    assert app._diff_requests(7, ROWS, [list(row) for row in ROWS]) == []
+
+
+@pytest.mark.parametrize('old_rows, new_rows', [
+    (None, ROWS),
+    ([], ROWS),
+    (ROWS, [HEADER + ['Notes']] + [row + [''] for row in ROWS[1:]]),
+    (ROWS, ROWS + [['C0001', 'Asha again', 'New Lead']]),
+    (ROWS, [HEADER, ROWS[2], ROWS[1], ROWS[3]]),
+], ids=['no-snapshot', 'empty-snapshot', 'header-change', 'duplicate-key', 'reordered'])
+def test_diff_falls_back_to_full_write(old_rows, new_rows):
+    assert app._diff_requests(7, old_rows, new_rows) is None
+
+
+def test_write_rows_sends_a_diff_when_the_sheet_matches():
+    client = FakeSheetsClient()
+    df = client_rows(3)
+    client.seed_rows('clients', app._frame_rows(df))
+    app._remember_synced('clients', 'Sheet1', df)
+    df.loc[1, 'Status'] = 'Interested'
+    app._write_rows(client, 'clients', df)
+    assert client.stats['batch_update'] == 1 and client.stats['update'] == 0
+    assert client.dump_rows('clients')[2][app.CLIENT_COLUMNS.index('Status')] == 'Interested'
+
+
+def test_write_rows_rewrites_a_sheet_reordered_outside_the_app():
+    client = FakeSheetsClient()
+    df = client_rows(4)
+    rows = app._frame_rows(df)
+    app._remember_synced('clients', 'Sheet1', df)
+    # Sorted in the Google Sheets UI since the snapshot was taken
+    client.seed_rows('clients', [rows[0]] + rows[:0:-1])
+    df.loc[1, 'Status'] = 'Interested'
+    app._write_rows(client, 'clients', df.drop(3))
+    assert client.stats['batch_update'] == 0
+    sheet = client.dump_rows('clients')
+    assert [row[0] for row in sheet[1:]] == ['C0001', 'C0002', 'C0003']
+    assert sheet[2][app.CLIENT_COLUMNS.index('Status')] == 'Interested'
+
+
+def test_phone_numbers_load_as_text_and_save_without_changes():
+    client = FakeSheetsClient()
+    df = client_rows(2)
+    df['Contact_Number'] = ['0412345678', '98765']
+    client.seed_rows('clients', app._frame_rows(df))
+    loaded = app.load_from_sheets(client, 'clients', table='clients')
+    assert loaded['Contact_Number'].tolist() == ['0412345678', '98765']
+    app._write_rows(client, 'clients', loaded)
+    assert client.stats['batch_update'] == 0 and client.stats['update'] == 0
+
+
+def test_a_slow_save_does_not_hold_up_other_sheets():
+    client = FakeSheetsClient()
+    df = client_rows(3)
+    client.seed_rows('clients', app._frame_rows(df))
+    app._remember_synced('clients', 'Sheet1', df)
+    started, release = threading.Event(), threading.Event()
+    call = client._call
+
+    def throttled(method, cells=0):
+        if method == 'batch_update':
+            started.set()
+            release.wait(5)
+        call(method, cells)
+
+    client._call = throttled
+    df.loc[1, 'Status'] = 'Interested'
+    writer = threading.Thread(target=app._write_rows, args=(client, 'clients', df))
+    writer.start()
+    assert started.wait(5)
+    # A cold load of another sheet records its snapshot while the save is stuck
+    loader = threading.Thread(target=app._remember_synced, args=('users', 'Sheet1', seed_tables()['users']))
+    loader.start()
+    loader.join(1)
+    blocked = loader.is_alive()
+    release.set()
+    writer.join(5)
+    loader.join(5)
+    assert not blocked
+    assert client.dump_rows('clients')[2][app.CLIENT_COLUMNS.index('Status')] == 'Interested'
+
+
+def test_failed_saves_are_reported_by_storage_errors():
+    client = FakeSheetsClient()
+    storage = app.SheetsStorage(client, dict(SHEETS_CONFIG))
+    storage.save('clients', app.apply_schema('clients', client_rows(2)))
+    app._write_queue().flush()
+    assert storage.errors() == []
+    client.fail_next('batch_update', status=403)
+    storage.save('clients', app.apply_schema('clients', client_rows(3)))
+    app._write_queue().flush()
+    assert len(storage.errors()) == 1
+    storage.save('clients', app.apply_schema('clients', client_rows(3)))
+    app._write_queue().flush()
+    assert storage.errors() == []
+
+
+def test_unreadable_users_sheet_is_not_overwritten():
+    client = FakeSheetsClient()
+    storage = app.SheetsStorage(client, dict(SHEETS_CONFIG))
+    users = seed_tables()['users']
+    client.seed_rows('users', app._frame_rows(users))
+    client.fail_next('get_all_records', status=403, count=4)
+    switch({'storage': storage})
+    app.initialize_session_state()
+    app.initialize_data()
+    app._write_queue().flush()
+    assert client.dump_rows('users')[1][0] == 'admin'
+    assert client.dump_rows('users')[1][1] == users.loc[0, 'Password']
+    assert st.session_state.users.empty
+    assert app.authenticate('admin', 'lyns2024')[0] is False
+
+    # Read again on the next run
+    app.initialize_data()
+    assert app.authenticate('admin', 'secret')[0] is True
+
+
+def test_empty_users_sheet_gets_the_default_admin():
+    client = FakeSheetsClient()
+    switch({'storage': app.SheetsStorage(client, dict(SHEETS_CONFIG))})
+    app.initialize_session_state()
+    app.initialize_data()
+    app._write_queue().flush()
+    assert [row[0] for row in client.dump_rows('users')[1:]] == ['admin']
+    assert app.authenticate('admin', 'lyns2024')[0] is True
+
+
+# Compare-and-set
+
+def test_shared_commit_rejects_a_stale_version_without_writing():
+    key = ('clients', 'Sheet1')
+    df = app.apply_schema('clients', client_rows(3))
+    app._shared_put(key, df)
+    edited = df.iloc[[0]].copy()
+    app._set_cell(edited, 0, 'Status', 'Contacted')
+    app._shared_commit({key: ('clients', {'rows': edited})})
+    before = app._shared_frame(key)
+    version = app.shared_version(*key)
+
+    # Still at the version read before the first commit
+    stale = df.iloc[[0]].copy()
+    app._set_cell(stale, 0, 'Status', 'Interested')
+    called = []
+    with pytest.raises(app.WriteConflict) as conflict:
+        app._shared_commit({key: ('clients', {'rows': stale, 'deleted': {'C0002': 0},
+                                              'appended': [{'Client_ID': 'C0009', 'Client_Name': 'New'}]})},
+                           then=called.append)
+    assert conflict.value.keys == ['C0001']
+    assert not called
+    assert app.shared_version(*key) == version
+    after = app._shared_frame(key)
+    assert after['Client_ID'].tolist() == ['C0001', 'C0002', 'C0003']
+    assert after.equals(before)
+
+
+def test_sqlite_commit_rejects_a_stale_version_without_writing(tmp_path):
+    storage = app.SQLiteStorage(str(tmp_path / 'crm.db'))
+    for table, df in seed_tables().items():
+        storage.save(table, app.apply_schema(table, df))
+    df = storage.load('clients')
+    fresh = df.copy()
+    app._set_cell(fresh, 0, 'Status', 'Contacted')
+    storage.commit({'clients': {'df': fresh, 'updated': ['C0001']}})
+
+    stale = df.copy()
+    app._set_cell(stale, 0, 'Status', 'Interested')
+    deal = {**dict.fromkeys(app.DEAL_COLUMNS, ''), 'Deal_ID': 'D0001', 'Client_ID': 'C0001'}
+    with pytest.raises(app.WriteConflict):
+        storage.commit({'clients': {'df': stale, 'updated': ['C0001'], 'deleted': {'C0002': 0}},
+                        'deals': {'appended': [deal]}})
+    clients = stored(storage, 'clients')
+    assert clients['Client_ID'].tolist() == ['C0001', 'C0002', 'C0003', 'C0004', 'C0005']
+    assert clients.loc[0, 'Status'] == 'Contacted'
+    assert clients.loc[0, app.ROW_VERSION] == 1
+    assert stored(storage, 'deals').empty
+
+
+def new_client(name):
+    return {'name': name, 'contact': '9876543210', 'email': '', 'client_type': 'Buyer',
+            'property_category': 'Residential', 'property_type': 'Apartment', 'furnishing_status': 'Furnished',
+            'budget_min': 50, 'budget_max': 90, 'budget_currency': '₹ Lakhs', 'location': 'Powai', 'bhk': '2 BHK',
+            'requirements': '', 'possession_date': '', 'assigned_to': 'Partner', 'source': 'Direct',
+            'priority': 'High'}
+
+
+def test_two_sessions_adding_the_same_new_id_conflict(storage, emails):
+    a, b = new_session(storage), new_session(storage)
+    switch(b)
+    assert app.add_client(new_client('From B')) == 'C0006'
+    b = switch(a)
+    # a hasn't seen b's client yet, so it numbers its own the same
+    assert app.add_client(new_client('From A')) == 'C0006'
+    assert st.session_state.write_conflicts
+    clients = stored(storage, 'clients')
+    assert clients['Client_ID'].tolist() == ['C0001', 'C0002', 'C0003', 'C0004', 'C0005', 'C0006']
+    assert clients['Client_Name'].tolist()[-1] == 'From B'
+
+    # After reloading, the retry gets the next free ID
+    app.initialize_data()
+    assert app.add_client(new_client('From A')) == 'C0007'
+    assert stored(storage, 'clients')['Client_ID'].tolist()[-2:] == ['C0006', 'C0007']
+    assert app.get_record('clients', 'C0006')['Client_Name'] == 'From B'
+
+
+# Unit of work
+
+def close_deal(client_id):
+    with app.unit_of_work() as work:
+        app.add_deal({'client_id': client_id, 'listing_id': 'N/A', 'brokerage_owner': 100, 'brokerage_client': 100,
+                      'num_brokers': 1, 'partner_name': 'Partner', 'notes': ''})
+        app.update_client_status(client_id, 'Deal Closed')
+    return work
+
+
+def test_conflicted_unit_of_work_saves_no_deal_and_sends_no_email(storage, emails):
+    a, b = new_session(storage), new_session(storage)
+    switch(b)
+    app.update_client_status('C0001', 'Negotiation')
+    switch(a)
+    emails.clear()
+
+    work = close_deal('C0001')
+    assert work['saved'] is False
+    assert not emails
+    assert st.session_state.write_conflicts
+    assert stored(storage, 'deals').empty
+    assert stored(storage, 'clients').set_index('Client_ID').loc['C0001', 'Status'] == 'Negotiation'
+    # The session reloads the saved data and shows no deal either
+    app.initialize_data()
+    assert st.session_state.deals.empty
+
+    work = close_deal('C0001')
+    assert work['saved'] is True
+    assert len(emails) == 1
+    assert stored(storage, 'deals')['Client_ID'].tolist() == ['C0001']
+    assert stored(storage, 'clients').set_index('Client_ID').loc['C0001', 'Status'] == 'Deal Closed'
+
+
+def test_storage_error_saves_nothing_and_reloads(tmp_path, emails, monkeypatch):
+    storage = app.SQLiteStorage(str(tmp_path / 'crm.db'))
+    for table, df in seed_tables().items():
+        storage.save(table, app.apply_schema(table, df))
+    switch(new_session(storage))
+    emails.clear()
+
+    def locked(changes):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(storage, 'commit', locked)
+    work = close_deal('C0001')
+    assert work['saved'] is False
+    assert not emails
+    monkeypatch.undo()
+    app.initialize_data()
+    assert st.session_state.deals.empty
+    assert st.session_state.clients.set_index('Client_ID').loc['C0001', 'Status'] == 'New Lead'